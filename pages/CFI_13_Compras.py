@@ -396,15 +396,12 @@ st.markdown("""
 # ================================================================
 @st.cache_resource
 def init_controller():
-    """Inicializa el controlador con cache."""
+    """Inicializa el controlador con cache (instancia única por proceso)."""
     if controller_available and CFIComprasController:
         return CFIComprasController()
     return None
 
-if 'cfi_compras_controller' not in st.session_state:
-    st.session_state.cfi_compras_controller = init_controller()
-
-controller = st.session_state.cfi_compras_controller
+controller = init_controller()
 
 # ================================================================
 # FUNCIONES DE UTILIDAD
@@ -455,10 +452,13 @@ st.markdown("""
 # ================================================================
 # INFORMACIÓN DE PERÍODO
 # ================================================================
+# Marca temporal única por ejecución (alerta de período y nombre de exportación)
+now = datetime.now()
+
 st.markdown("""
 <div class="alert alert-info">
     <strong>📅 Período de Análisis:</strong> Enero - Diciembre 2025 (12 meses) | 
-    <strong>🔄 Última Actualización:</strong> """ + datetime.now().strftime('%d/%m/%Y %H:%M') + """
+    <strong>🔄 Última Actualización:</strong> """ + now.strftime('%d/%m/%Y %H:%M') + """
 </div>
 """, unsafe_allow_html=True)
 
@@ -657,14 +657,13 @@ if controller and controller.is_initialized():
         
         # Mostrar alertas si las hay
         alerts = controller.get_alerts()
-        for alert in alerts:
-            alert_class = f"alert-{alert.get('type', 'info')}"
-            st.markdown(f"""
-            <div class="alert {alert_class}">
-                <strong>{alert.get('title', '')}</strong><br>
-                {alert.get('message', '')}
-            </div>
-            """, unsafe_allow_html=True)
+        alerts_html = ''.join([
+            f'<div class="alert alert-{alert.get("type", "info")}">'
+            f'<strong>{alert.get("title", "")}</strong><br>{alert.get("message", "")}</div>'
+            for alert in alerts
+        ])
+        if alerts_html:
+            st.markdown(alerts_html, unsafe_allow_html=True)
         
         # ================================================================
         # SECCIÓN 1: KPI CARDS SEGÚN ESPECIFICACIONES
@@ -915,7 +914,7 @@ if controller and controller.is_initialized():
                 st.download_button(
                     label="📄 Descargar Tabla KPIs CFI Compras",
                     data=csv_data,
-                    file_name=f"KPIs_CFI_Compras_Comparativa_{datetime.now().strftime('%Y%m%d')}.csv",
+                    file_name=f"KPIs_CFI_Compras_Comparativa_{now.strftime('%Y%m%d')}.csv",
                     mime="text/csv"
                 )
             else:
@@ -12,9 +12,6 @@ Versión: 2.1 (Visual y Limpia)
 import streamlit as st
 import pandas as pd
 import numpy as np
-import plotly.express as px
-import plotly.graph_objects as go
-from plotly.subplots import make_subplots
 import sys
 import os
 from datetime import datetime
@@ -63,8 +60,41 @@ MESES_NOMBRES_LOCAL = [
     'Julio', 'Agosto', 'Septiembre', 'Octubre', 'Noviembre', 'Diciembre'
 ]
 
-# Estilos CSS mejorados
-st.markdown("""
+# Plantillas hover de los gráficos (precalculadas una vez)
+LINE_HOVER = {
+    m: f'<b>{m}</b><br>Fecha: %{{x}}<br>Cantidad: %{{y:,.0f}} kg<br><extra></extra>'
+    for m in ('MP', 'DESGR', 'CAT I', 'CAT II', 'DAG')
+}
+STACKED_HOVER = {
+    tipo: {
+        c: f'<b>{c}</b><br>{eje}: %{{x}}<br>Cantidad: %{{y:,.0f}} kg<br><extra></extra>'
+        for c in ('CAT I', 'CAT II', 'DAG', 'MERMA')
+    }
+    for tipo, eje in (('daily', 'Fecha'), ('monthly', 'Mes'))
+}
+
+# Layout común de los gráficos Plotly
+CHART_TITLE_FONT = dict(size=20, color='#1f4e79')
+CHART_BASE_LAYOUT = dict(
+    hovermode='x unified',
+    legend=dict(
+        orientation="h",
+        yanchor="bottom",
+        y=1.02,
+        xanchor="center",
+        x=0.5,
+        bgcolor="rgba(255,255,255,0.8)",
+        bordercolor="rgba(0,0,0,0.2)",
+        borderwidth=1
+    ),
+    height=500,
+    template='plotly_white',
+    plot_bgcolor='rgba(248,249,250,0.8)'
+)
+
+# Estilos CSS mejorados (constante de módulo; se re-emite en cada ejecución
+# porque Streamlit elimina los elementos que no se vuelven a renderizar)
+PAGE_CSS = """
 <style>
 .main-header {
     background: linear-gradient(135deg, #1f4e79 0%, #2e7d32 50%, #1565c0 100%);
@@ -194,15 +224,22 @@ st.markdown("""
     border-bottom: 2px solid #e9ecef;
 }
 </style>
-""", unsafe_allow_html=True)
+"""
+
+st.markdown(PAGE_CSS, unsafe_allow_html=True)
 
 # ================================================================
 # FUNCIONES DE CARGA DE DATOS (CON LOGGING OCULTO)
 # ================================================================
 
-@st.cache_data(ttl=300)
+@st.cache_resource(ttl=300)
 def load_production_data_silent():
-    """Carga datos de producción silenciosamente."""
+    """
+    Carga datos de producción silenciosamente.
+    
+    Se cachea como recurso (sin copia ni hash del resultado): el dict devuelto
+    es compartido y los llamadores no deben modificarlo.
+    """
     if not SYSTEM_READY:
         return None
     
@@ -223,21 +260,74 @@ def load_production_data_silent():
         st.error(f"❌ Error cargando datos: {e}")
         return None
 
+def get_data_id(production_data: Dict[str, Any]) -> str:
+    """Huella estable de los datos cargados, basada en sus metadatos."""
+    metadata = production_data.get('metadata', {})
+    return f"{metadata.get('processed_at', '')}|{metadata.get('total_sheets', 0)}"
+
+@st.cache_resource(max_entries=2)
+def get_cached_controller(data_id: str, _production_data: Dict[str, Any]):
+    """Crea el controller una sola vez por conjunto de datos (data_id); conserva los dos últimos."""
+    return create_controller(_production_data)
+
+# ================================================================
+# CÁLCULOS CACHEADOS POR (DATOS, MODO, MES/MESES)
+# ================================================================
+
+def get_filter_key(filtros: Dict[str, Any]):
+    """Clave hashable del filtro: mes (str) o tupla de meses."""
+    if filtros['modo'] == 'individual':
+        return filtros['mes']
+    return tuple(filtros['meses'])
+
+@st.cache_data(ttl=300)
+def compute_kpis(data_id: str, mode: str, key, _controller) -> Dict[str, Any]:
+    """KPIs del período seleccionado."""
+    if mode == 'individual':
+        return _controller.calculate_kpis_individual(key)
+    return _controller.calculate_kpis_comparison(list(key))
+
+@st.cache_data(ttl=300)
+def compute_line_chart_data(data_id: str, mode: str, key, _controller) -> Dict[str, Any]:
+    """Datos del gráfico de líneas del período seleccionado."""
+    if mode == 'individual':
+        return _controller.get_line_chart_data(mes=key)
+    return _controller.get_line_chart_data(meses=list(key))
+
+@st.cache_data(ttl=300)
+def compute_stacked_bar_data(data_id: str, mode: str, key, _controller) -> Dict[str, Any]:
+    """Datos del gráfico de barras apiladas del período seleccionado."""
+    if mode == 'individual':
+        return _controller.get_stacked_bar_data(mes=key)
+    return _controller.get_stacked_bar_data(meses=list(key))
+
+@st.cache_data(ttl=300)
+def compute_summary_table(data_id: str, mode: str, key, _controller) -> Dict[str, Any]:
+    """Datos de la tabla de resumen del período seleccionado."""
+    if mode == 'individual':
+        return _controller.get_summary_table(mes=key)
+    return _controller.get_summary_table(meses=list(key))
+
 # ================================================================
 # FUNCIONES DE INTERFAZ
 # ================================================================
 
-def render_header():
-    """Renderiza el header principal con estilo mejorado."""
-    st.markdown("""
+@st.cache_data
+def get_header_html() -> str:
+    """HTML estático del header principal."""
+    return """
     <div class="main-header">
         <h1>🏭 Dashboard Producción KCTN</h1>
         <h3>Análisis Integral de Procesamiento de Ajos</h3>
         <p style="margin: 0; opacity: 0.8;">Control de Rendimiento, Calidad y Productividad</p>
     </div>
-    """, unsafe_allow_html=True)
+    """
 
-def render_system_status_compact():
+def render_header():
+    """Renderiza el header principal con estilo mejorado."""
+    st.markdown(get_header_html(), unsafe_allow_html=True)
+
+def render_system_status_compact(now: datetime):
     """Renderiza estado del sistema de forma compacta."""
     
     if not SYSTEM_READY:
@@ -254,6 +344,7 @@ def render_system_status_compact():
             with col1:
                 if st.button("🔄 **Actualizar**", use_container_width=True):
                     clear_cache()
+                    load_production_data_silent.clear()
                     st.rerun()
             
             with col2:
@@ -264,8 +355,7 @@ def render_system_status_compact():
                 st.markdown(f"**Parsers:** {system_status.get('parsers_cached', 0)}")
             
             with col4:
-                current_time = datetime.now()
-                st.markdown(f"**Hora:** {current_time.strftime('%H:%M')}")
+                st.markdown(f"**Hora:** {now.strftime('%H:%M')}")
             
             return system_status.get('sharepoint_available', False)
             
@@ -320,8 +410,7 @@ def render_sidebar_filters_fixed():
         
         # Mostrar nombres de meses seleccionados
         st.sidebar.markdown("**Meses seleccionados:**")
-        for mes in meses_seleccionados:
-            st.sidebar.markdown(f"• {mes}")
+        st.sidebar.markdown("  \n".join(f"• {mes}" for mes in meses_seleccionados))
         
         return {
             'modo': 'comparison',
@@ -329,168 +418,76 @@ def render_sidebar_filters_fixed():
             'meses': meses_seleccionados
         }
 
-def render_kpi_cards_visual(controller, filtros):
+def render_kpi_cards_visual(kpis, filtros):
     """Renderiza cards de KPIs de forma más visual."""
     st.markdown('<div class="section-title">📊 Indicadores Clave de Rendimiento</div>', unsafe_allow_html=True)
     
-    # Calcular KPIs según modo
+    if not kpis or kpis.get('mp_total', 0) == 0:
+        st.warning("⚠️ No hay datos disponibles para el período seleccionado")
+        return
+    
+    # Subtítulo según modo
     if filtros['modo'] == 'individual':
-        kpis = controller.calculate_kpis_individual(filtros['mes'])
         subtitle = f"📅 **Mes:** {filtros['mes']} 2025"
     else:
-        kpis = controller.calculate_kpis_comparison(filtros['meses'])
         subtitle = f"📅 **Período:** {filtros['meses'][0]} - {filtros['meses'][-1]} 2025"
     
     st.markdown(subtitle)
     st.markdown("---")
     
-    if not kpis or kpis.get('mp_total', 0) == 0:
-        st.warning("⚠️ No hay datos disponibles para el período seleccionado")
-        return
-    
-    # === PRIMERA FILA: MATERIA PRIMA, DESGRANADO, CAT I ===
-    col1, col2, col3 = st.columns(3)
-    
-    with col1:
-        # Card 1: Materia Prima
-        st.markdown(f"""
-        <div class="kpi-card">
-            <div class="kpi-value">{kpis.get('mp_total', 0):,.0f} kg</div>
-            <div class="kpi-label">Materia Prima Total</div>
-        </div>
-        """, unsafe_allow_html=True)
-    
-    with col2:
-        # Card 2: Desgranado
-        desgr_pct = kpis.get('desgr_percentage', 0)
-        delta_class = f"delta-{kpis.get('desgr_delta', 'regular').lower()}"
-        
-        st.markdown(f"""
-        <div class="kpi-card">
-            <div class="kpi-value">{kpis.get('desgr_total', 0):,.0f} kg</div>
-            <div class="kpi-label">Rendimiento Desgranado</div>
-            <div class="{delta_class}">{desgr_pct:.1f}% - {kpis.get('desgr_delta', 'Regular')}</div>
-        </div>
-        """, unsafe_allow_html=True)
-    
-    with col3:
-        # Card 3: CAT I
-        cat_i_pct = kpis.get('cat_i_percentage', 0)
-        delta_class = f"delta-{kpis.get('cat_i_delta', 'regular').lower()}"
-        
-        st.markdown(f"""
-        <div class="kpi-card">
-            <div class="kpi-value">{kpis.get('cat_i_total', 0):,.0f} kg</div>
-            <div class="kpi-label">Categoría I</div>
-            <div class="{delta_class}">{cat_i_pct:.1f}% - {kpis.get('cat_i_delta', 'Regular')}</div>
-        </div>
-        """, unsafe_allow_html=True)
-    
-    # === SEGUNDA FILA: CAT II, DAG, MERMA ===
-    col1, col2, col3 = st.columns(3)
-    
-    with col1:
-        # Card 4: CAT II
-        cat_ii_pct = kpis.get('cat_ii_percentage', 0)
-        delta_class = f"delta-{kpis.get('cat_ii_delta', 'regular').lower()}"
-        
-        st.markdown(f"""
-        <div class="kpi-card">
-            <div class="kpi-value">{kpis.get('cat_ii_total', 0):,.0f} kg</div>
-            <div class="kpi-label">Categoría II</div>
-            <div class="{delta_class}">{cat_ii_pct:.1f}% - {kpis.get('cat_ii_delta', 'Regular')}</div>
-        </div>
-        """, unsafe_allow_html=True)
-    
-    with col2:
-        # Card 5: DAG
-        dag_pct = kpis.get('dag_percentage', 0)
-        delta_class = f"delta-{kpis.get('dag_delta', 'regular').lower()}"
-        
-        st.markdown(f"""
-        <div class="kpi-card">
-            <div class="kpi-value">{kpis.get('dag_total', 0):,.0f} kg</div>
-            <div class="kpi-label">DAG</div>
-            <div class="{delta_class}">{dag_pct:.1f}% - {kpis.get('dag_delta', 'Regular')}</div>
-        </div>
-        """, unsafe_allow_html=True)
-    
-    with col3:
-        # Card 6: Merma
-        merma_pct = kpis.get('merma_percentage', 0)
-        delta_class = f"delta-{kpis.get('merma_delta', 'regular').lower()}"
-        
-        st.markdown(f"""
-        <div class="kpi-card">
-            <div class="kpi-value">{kpis.get('merma_total', 0):,.0f} kg</div>
-            <div class="kpi-label">Merma</div>
-            <div class="{delta_class}">{merma_pct:.1f}% - {kpis.get('merma_delta', 'Regular')}</div>
-        </div>
-        """, unsafe_allow_html=True)
-    
-    # === TERCERA FILA: PRODUCTIVIDAD, PROMEDIO DIARIO, PROMEDIO HORA ===
-    col1, col2, col3 = st.columns(3)
+    # Lectura única de los valores de KPIs
+    g = kpis.get
+    promedio_diario = g('promedio_diario', {})
+    promedio_hora = g('promedio_hora', {})
+    
+    # (valor, etiqueta, clase delta, texto delta) por card; sin delta -> None
+    cards = [(f"{g('mp_total', 0):,.0f} kg", "Materia Prima Total", None, None)]
+    for prefix, label in (('desgr', 'Rendimiento Desgranado'), ('cat_i', 'Categoría I'),
+                          ('cat_ii', 'Categoría II'), ('dag', 'DAG'), ('merma', 'Merma')):
+        delta = g(f'{prefix}_delta', 'Regular')
+        cards.append((
+            f"{g(f'{prefix}_total', 0):,.0f} kg",
+            label,
+            f"delta-{delta.lower()}",
+            f"{g(f'{prefix}_percentage', 0):.1f}% - {delta}"
+        ))
+    cards.append((f"{g('productividad_personal', 0):,.0f} kg", "Productividad por Trabajador", None, None))
+    
+    cards_html = []
+    for value, label, delta_class, delta_text in cards:
+        delta_html = f'<div class="{delta_class}">{delta_text}</div>' if delta_class else ''
+        cards_html.append(
+            f'<div class="kpi-card"><div class="kpi-value">{value}</div>'
+            f'<div class="kpi-label">{label}</div>{delta_html}</div>'
+        )
     
-    with col1:
-        # Card 7: Productividad Personal
-        productividad = kpis.get('productividad_personal', 0)
-        
-        st.markdown(f"""
-        <div class="kpi-card">
-            <div class="kpi-value">{productividad:,.0f} kg</div>
-            <div class="kpi-label">Productividad por Trabajador</div>
-        </div>
-        """, unsafe_allow_html=True)
+    # Cards de promedios (diario y por hora)
+    for titulo, promedios in (('Promedio Diario', promedio_diario), ('Promedio por Hora', promedio_hora)):
+        detalle = '<br>'.join(
+            f"<strong>{nombre}:</strong> {promedios.get(clave, 0):,.0f} kg"
+            for nombre, clave in (('MP', 'mp'), ('DESGR', 'desgr'), ('CAT I', 'cat_i'),
+                                  ('CAT II', 'cat_ii'), ('DAG', 'dag'))
+        )
+        cards_html.append(
+            f'<div class="kpi-card"><div class="kpi-label"><strong>{titulo}</strong></div>'
+            f'<div class="kpi-detail">{detalle}</div></div>'
+        )
     
-    with col2:
-        # Card 8: Promedio Diario
-        promedio_diario = kpis.get('promedio_diario', {})
-        
-        st.markdown(f"""
-        <div class="kpi-card">
-            <div class="kpi-label"><strong>Promedio Diario</strong></div>
-            <div class="kpi-detail">
-                <strong>MP:</strong> {promedio_diario.get('mp', 0):,.0f} kg<br>
-                <strong>DESGR:</strong> {promedio_diario.get('desgr', 0):,.0f} kg<br>
-                <strong>CAT I:</strong> {promedio_diario.get('cat_i', 0):,.0f} kg<br>
-                <strong>CAT II:</strong> {promedio_diario.get('cat_ii', 0):,.0f} kg<br>
-                <strong>DAG:</strong> {promedio_diario.get('dag', 0):,.0f} kg
-            </div>
-        </div>
-        """, unsafe_allow_html=True)
+    # Las 9 cards en una única rejilla 3x3 (un solo st.markdown)
+    html = (
+        '<div style="display: grid; grid-template-columns: repeat(3, 1fr); gap: 1rem;">'
+        + ''.join(cards_html)
+        + '</div>'
+    )
     
-    with col3:
-        # Card 9: Promedio por Hora
-        promedio_hora = kpis.get('promedio_hora', {})
-        
-        st.markdown(f"""
-        <div class="kpi-card">
-            <div class="kpi-label"><strong>Promedio por Hora</strong></div>
-            <div class="kpi-detail">
-                <strong>MP:</strong> {promedio_hora.get('mp', 0):,.0f} kg<br>
-                <strong>DESGR:</strong> {promedio_hora.get('desgr', 0):,.0f} kg<br>
-                <strong>CAT I:</strong> {promedio_hora.get('cat_i', 0):,.0f} kg<br>
-                <strong>CAT II:</strong> {promedio_hora.get('cat_ii', 0):,.0f} kg<br>
-                <strong>DAG:</strong> {promedio_hora.get('dag', 0):,.0f} kg
-            </div>
-        </div>
-        """, unsafe_allow_html=True)
+    st.markdown(html, unsafe_allow_html=True)
 
-def render_line_chart_enhanced(controller, filtros):
-    """Renderiza gráfico de líneas mejorado."""
-    st.markdown('<div class="section-title">📈 Evolución de Producción</div>', unsafe_allow_html=True)
-    
-    # Obtener datos
-    if filtros['modo'] == 'individual':
-        chart_data = controller.get_line_chart_data(mes=filtros['mes'])
-    else:
-        chart_data = controller.get_line_chart_data(meses=filtros['meses'])
-    
-    if 'error' in chart_data:
-        st.warning(f"⚠️ {chart_data['error']}")
-        return
+@st.cache_data(ttl=300)
+def build_line_figure(data_id: str, mode: str, key, _chart_data: Dict[str, Any]) -> Dict[str, Any]:
+    """Construye el gráfico de líneas y lo devuelve serializado (fig.to_dict())."""
+    import plotly.graph_objects as go  # importación diferida: solo al construir gráficos
     
-    # Crear gráfico mejorado
+    chart_data = _chart_data
     fig = go.Figure()
     
     data = chart_data['data']
@@ -510,59 +507,44 @@ def render_line_chart_enhanced(controller, filtros):
             name=metric,
             line=dict(color=colors[metric], width=3),
             marker=dict(size=8, line=dict(width=2, color='white')),
-            hovertemplate=f'<b>{metric}</b><br>' +
-                         'Fecha: %{x}<br>' +
-                         'Cantidad: %{y:,.0f} kg<br>' +
-                         '<extra></extra>'
+            hovertemplate=LINE_HOVER[metric]
         ))
     
     fig.update_layout(
-        title=dict(
-            text=chart_data['title'],
-            font=dict(size=20, color='#1f4e79'),
-            x=0.5
-        ),
+        **CHART_BASE_LAYOUT,
+        title=dict(text=chart_data['title'], font=CHART_TITLE_FONT, x=0.5),
         xaxis_title=chart_data['xaxis_title'],
-        yaxis_title=chart_data['yaxis_title'],
-        hovermode='x unified',
-        legend=dict(
-            orientation="h", 
-            yanchor="bottom", 
-            y=1.02, 
-            xanchor="center", 
-            x=0.5,
-            bgcolor="rgba(255,255,255,0.8)",
-            bordercolor="rgba(0,0,0,0.2)",
-            borderwidth=1
-        ),
-        height=500,
-        template='plotly_white',
-        plot_bgcolor='rgba(248,249,250,0.8)'
+        yaxis_title=chart_data['yaxis_title']
     )
     
-    st.plotly_chart(fig, use_container_width=True)
+    return fig.to_dict()
 
-def render_stacked_bar_chart_enhanced(controller, filtros):
-    """Renderiza gráfico de barras apiladas mejorado."""
-    st.markdown('<div class="section-title">📊 Composición de Producción</div>', unsafe_allow_html=True)
-    
-    # Obtener datos
-    if filtros['modo'] == 'individual':
-        chart_data = controller.get_stacked_bar_data(mes=filtros['mes'])
-    else:
-        chart_data = controller.get_stacked_bar_data(meses=filtros['meses'])
+def render_line_chart_enhanced(chart_data, data_id, mode, key):
+    """Renderiza gráfico de líneas mejorado."""
+    st.markdown('<div class="section-title">📈 Evolución de Producción</div>', unsafe_allow_html=True)
     
     if 'error' in chart_data:
         st.warning(f"⚠️ {chart_data['error']}")
         return
     
-    # Preparar datos
-    data = chart_data['data']
+    fig = build_line_figure(data_id, mode, key, chart_data)
+    st.plotly_chart(fig, use_container_width=True)
+
+@st.cache_data(ttl=300)
+def build_stacked_bar_figure(data_id: str, mode: str, key, _chart_data: Dict[str, Any]) -> Dict[str, Any]:
+    """Construye el gráfico de barras apiladas y lo devuelve serializado (fig.to_dict())."""
+    import plotly.graph_objects as go  # importación diferida: solo al construir gráficos
     
-    if chart_data['type'] == 'daily':
-        x_values = [d['fecha'] for d in data]
-    else:
-        x_values = [d['mes'] for d in data]
+    chart_data = _chart_data
+    
+    # Preparar datos: transponer lista de dicts a columnas en una sola pasada
+    data = chart_data['data']
+    x_key = 'fecha' if chart_data['type'] == 'daily' else 'mes'
+    columns = {k: [] for k in (x_key, 'CAT I', 'CAT II', 'DAG', 'MERMA')}
+    for d in data:
+        for k, values in columns.items():
+            values.append(d[k])
+    x_values = columns[x_key]
     
     # Crear gráfico mejorado
     fig = go.Figure()
@@ -574,57 +556,46 @@ def render_stacked_bar_chart_enhanced(controller, filtros):
         'MERMA': '#8c564b'
     }
     
+    hover = STACKED_HOVER['daily' if chart_data['type'] == 'daily' else 'monthly']
     for categoria in ['CAT I', 'CAT II', 'DAG', 'MERMA']:
-        y_values = [d[categoria] for d in data]
-        
         fig.add_trace(go.Bar(
             x=x_values,
-            y=y_values,
+            y=columns[categoria],
             name=categoria,
             marker_color=colors_stack[categoria],
-            hovertemplate=f'<b>{categoria}</b><br>' +
-                         ('Fecha: %{x}<br>' if chart_data['type'] == 'daily' else 'Mes: %{x}<br>') +
-                         'Cantidad: %{y:,.0f} kg<br>' +
-                         '<extra></extra>'
+            hovertemplate=hover[categoria]
         ))
     
     fig.update_layout(
-        title=dict(
-            text=chart_data['title'],
-            font=dict(size=20, color='#1f4e79'),
-            x=0.5
-        ),
+        **CHART_BASE_LAYOUT,
+        title=dict(text=chart_data['title'], font=CHART_TITLE_FONT, x=0.5),
         xaxis_title=chart_data['xaxis_title'],
         yaxis_title=chart_data['yaxis_title'],
-        barmode='stack',
-        hovermode='x unified',
-        legend=dict(
-            orientation="h", 
-            yanchor="bottom", 
-            y=1.02, 
-            xanchor="center", 
-            x=0.5,
-            bgcolor="rgba(255,255,255,0.8)",
-            bordercolor="rgba(0,0,0,0.2)",
-            borderwidth=1
-        ),
-        height=500,
-        template='plotly_white',
-        plot_bgcolor='rgba(248,249,250,0.8)'
+        barmode='stack'
     )
     
+    return fig.to_dict()
+
+def render_stacked_bar_chart_enhanced(chart_data, data_id, mode, key):
+    """Renderiza gráfico de barras apiladas mejorado."""
+    st.markdown('<div class="section-title">📊 Composición de Producción</div>', unsafe_allow_html=True)
+    
+    if 'error' in chart_data:
+        st.warning(f"⚠️ {chart_data['error']}")
+        return
+    
+    fig = build_stacked_bar_figure(data_id, mode, key, chart_data)
     st.plotly_chart(fig, use_container_width=True)
 
-def render_summary_table_enhanced(controller, filtros):
+@st.cache_data(ttl=300)
+def build_summary_dataframe(data_id: str, mode: str, key, _table_data: Dict[str, Any]) -> pd.DataFrame:
+    """Construye el DataFrame de la tabla de resumen."""
+    return pd.DataFrame(_table_data['data'])
+
+def render_summary_table_enhanced(table_data, data_id, mode, key):
     """Renderiza tabla de resumen mejorada."""
     st.markdown('<div class="section-title">📋 Tabla de Resumen</div>', unsafe_allow_html=True)
     
-    # Obtener datos
-    if filtros['modo'] == 'individual':
-        table_data = controller.get_summary_table(mes=filtros['mes'])
-    else:
-        table_data = controller.get_summary_table(meses=filtros['meses'])
-    
     if 'error' in table_data:
         st.warning(f"⚠️ {table_data['error']}")
         return
@@ -632,7 +603,7 @@ def render_summary_table_enhanced(controller, filtros):
     # Mostrar tabla mejorada
     st.markdown(f"### {table_data['title']}")
     
-    df_table = pd.DataFrame(table_data['data'])
+    df_table = build_summary_dataframe(data_id, mode, key, table_data)
     
     st.dataframe(
         df_table,
@@ -672,10 +643,10 @@ def render_debug_info(production_data):
                 if not warnings and not errors:
                     st.success("✅ Sin avisos ni errores")
 
-def render_footer_enhanced():
-    """Renderiza footer mejorado."""
-    st.markdown("---")
-    st.markdown("""
+@st.cache_data
+def get_footer_html() -> str:
+    """HTML estático del footer (sin marca temporal)."""
+    return """
     <div style="
         background: linear-gradient(90deg, #f8f9fa 0%, #e9ecef 100%);
         padding: 1.5rem;
@@ -692,13 +663,61 @@ def render_footer_enhanced():
                 <strong>📊 Dashboard KCTN Producción</strong><br>
                 <small>Versión 2.1 - 2025</small>
             </div>
-            <div>
-                <strong>📅 Última actualización:</strong><br>
-                <small>{}</small>
-            </div>
         </div>
     </div>
-    """.format(datetime.now().strftime('%d/%m/%Y %H:%M:%S')), unsafe_allow_html=True)
+    """
+
+def render_footer_enhanced(now: datetime):
+    """Renderiza footer mejorado."""
+    st.markdown("---")
+    st.markdown(get_footer_html(), unsafe_allow_html=True)
+    st.caption(f"📅 Última actualización: {now.strftime('%d/%m/%Y %H:%M:%S')}")
+
+# ================================================================
+# CONTENIDO DEPENDIENTE DE FILTROS
+# ================================================================
+
+def render_filter_driven_body(controller, data_id: str):
+    """
+    Renderiza filtros, KPIs, gráficos y tabla de resumen.
+    
+    Agrupa todo lo que depende de los filtros; header, estado y footer quedan
+    fuera. No se decora con st.fragment porque los filtros viven en st.sidebar,
+    que Streamlit no permite escribir desde un fragment.
+    """
+    # Filtros corregidos (sin error de slider)
+    filtros = render_sidebar_filters_fixed()
+    
+    # Cálculos cacheados (una sola vez por datos + filtro). El controller se
+    # comparte entre sesiones: el mes/meses se pasan explícitamente en cada
+    # consulta y su estado no se modifica
+    mode = filtros['modo']
+    key = get_filter_key(filtros)
+    kpis = compute_kpis(data_id, mode, key, controller)
+    line_data = compute_line_chart_data(data_id, mode, key, controller)
+    stacked_data = compute_stacked_bar_data(data_id, mode, key, controller)
+    table_data = compute_summary_table(data_id, mode, key, controller)
+    
+    # === CONTENIDO PRINCIPAL VISUAL ===
+    
+    # KPIs principales
+    render_kpi_cards_visual(kpis, filtros)
+    
+    st.markdown("---")
+    
+    # Gráficos mejorados
+    col1, col2 = st.columns([1, 1])
+    
+    with col1:
+        render_line_chart_enhanced(line_data, data_id, mode, key)
+    
+    with col2:
+        render_stacked_bar_chart_enhanced(stacked_data, data_id, mode, key)
+    
+    st.markdown("---")
+    
+    # Tabla de resumen
+    render_summary_table_enhanced(table_data, data_id, mode, key)
 
 # ================================================================
 # FUNCIÓN PRINCIPAL
@@ -706,12 +725,15 @@ def render_footer_enhanced():
 
 def main():
     """Función principal del dashboard."""
+    # Marca temporal única para toda la ejecución
+    now = datetime.now()
+    
     try:
         # Header principal
         render_header()
         
         # Panel de control compacto
-        system_ready = render_system_status_compact()
+        system_ready = render_system_status_compact(now)
         
         if not system_ready:
             st.error("❌ **SharePoint no disponible** - Verificar configuración en secrets.toml")
@@ -728,44 +750,18 @@ def main():
             render_debug_info(None)
             st.stop()
         
-        # Crear controller
-        controller = create_controller(production_data)
-        
-        # Filtros corregidos (sin error de slider)
-        filtros = render_sidebar_filters_fixed()
-        
-        # Configurar controller
-        if filtros['modo'] == 'individual':
-            controller.set_filter_mode('individual', month=filtros['mes'])
-        else:
-            controller.set_filter_mode('comparison', months=filtros['meses'])
-        
-        # === CONTENIDO PRINCIPAL VISUAL ===
-        
-        # KPIs principales
-        render_kpi_cards_visual(controller, filtros)
-        
-        st.markdown("---")
-        
-        # Gráficos mejorados
-        col1, col2 = st.columns([1, 1])
-        
-        with col1:
-            render_line_chart_enhanced(controller, filtros)
-        
-        with col2:
-            render_stacked_bar_chart_enhanced(controller, filtros)
-        
-        st.markdown("---")
+        # Crear controller (cacheado por huella de datos)
+        data_id = get_data_id(production_data)
+        controller = get_cached_controller(data_id, production_data)
         
-        # Tabla de resumen
-        render_summary_table_enhanced(controller, filtros)
+        # Contenido dependiente de los filtros
+        render_filter_driven_body(controller, data_id)
         
         # Información de debug oculta
         render_debug_info(production_data)
         
         # Footer mejorado
-        render_footer_enhanced()
+        render_footer_enhanced(now)
         
     except Exception as e:
         st.error(f"❌ **Error crítico:** {e}")
@@ -773,7 +769,7 @@ def main():
         with st.expander("🔧 **Información de Debugging**", expanded=False):
             st.write("**System Ready:**", SYSTEM_READY)
             st.write("**Error Type:**", type(e).__name__)
-            st.write("**Current Time:**", datetime.now())
+            st.write("**Current Time:**", now)
             st.code(str(e))
 
 if __name__ == "__main__":
@@ -12,31 +12,41 @@ Versión: 3.1 - Completo con Debug Integrado
 import streamlit as st
 import sys
 import os
+import re
+import importlib
 import pandas as pd
 import plotly.express as px
 import plotly.graph_objects as go
 from datetime import datetime
+from string import Template
 import time
-import io
-import base64
+import traceback
+import uuid
 
 # ================================================================
 # CONFIGURACIÓN DE PÁGINA
 # ================================================================
-if 'page_config_set' not in st.session_state:
-    st.set_page_config(
-        page_title="Dashboard RRHH - Garlic & Beyond",
-        page_icon="🧄",
-        layout="wide",
-        initial_sidebar_state="expanded"
-    )
-    st.session_state.page_config_set = True
+st.set_page_config(
+    page_title="Dashboard RRHH - Garlic & Beyond",
+    page_icon="🧄",
+    layout="wide",
+    initial_sidebar_state="expanded"
+)
 
 # ================================================================
 # IMPORTACIONES SEGURAS DE MÓDULOS
 # ================================================================
+def _try_import(spec):
+    """Importa un objeto a partir de 'modulo:atributo'; devuelve None si no está disponible."""
+    module_name, attr_name = spec.split(':')
+    try:
+        return getattr(importlib.import_module(module_name), attr_name)
+    except (ImportError, AttributeError):
+        return None
+
+@st.cache_resource
 def safe_import():
-    """Importa módulos de manera segura con múltiples rutas."""
+    """Importa módulos de manera segura (una sola vez por proceso)."""
     try:
         # Agregar rutas posibles
         current_file = os.path.abspath(__file__)
@@ -49,43 +59,23 @@ def safe_import():
             if path not in sys.path:
                 sys.path.insert(0, path)
         
-        # Intentar importar Excel Loader
-        try:
-            from utils.excel_loader import get_dataframe
-            excel_available = True
-        except ImportError:
-            try:
-                from utils.excel_loader import get_dataframe
-                excel_available = True
-            except ImportError:
-                excel_available = False
-                get_dataframe = None
-        
-        # Intentar importar controlador
-        try:
-            from utils.controller_KCTN_02_RRHH import GarlicRRHHController
-            controller_available = True
-        except ImportError:
-            try:
-                from utils.controller_KCTN_02_RRHH import GarlicRRHHController
-                controller_available = True
-            except ImportError:
-                controller_available = False
-                GarlicRRHHController = None
-        
-        # Intentar importar parser
-        try:
-            from utils.parser_KCTN_02_RRHH import parse_excel
-            parser_available = True
-        except ImportError:
-            try:
-                from utils.parser_KCTN_02_RRHH import parse_excel
-                parser_available = True
-            except ImportError:
-                parser_available = False
-                parse_excel = None
+        # Excel Loader, controlador y parser (un único intento por módulo)
+        get_dataframe, GarlicRRHHController, parse_excel = (
+            _try_import(spec) for spec in (
+                'utils.excel_loader:get_dataframe',
+                'utils.controller_KCTN_02_RRHH:GarlicRRHHController',
+                'utils.parser_KCTN_02_RRHH:parse_excel',
+            )
+        )
         
-        return excel_available, controller_available, parser_available, get_dataframe, GarlicRRHHController, parse_excel
+        return (
+            get_dataframe is not None,
+            GarlicRRHHController is not None,
+            parse_excel is not None,
+            get_dataframe,
+            GarlicRRHHController,
+            parse_excel
+        )
         
     except Exception as e:
         st.error(f"Error en importaciones: {e}")
@@ -93,10 +83,14 @@ def safe_import():
 
 excel_available, controller_available, parser_available, get_dataframe, GarlicRRHHController, parse_excel = safe_import()
 
+# No fijar en caché una importación fallida: se reintenta en la siguiente ejecución
+if not (excel_available and controller_available and parser_available):
+    safe_import.clear()
+
 # ================================================================
 # CSS PERSONALIZADO PARA GARLIC & BEYOND
 # ================================================================
-st.markdown("""
+PAGE_CSS = """
 <style>
     /* Importar Google Fonts */
     @import url('https://fonts.googleapis.com/css2?family=Inter:wght@300;400;500;600;700&display=swap');
@@ -188,6 +182,12 @@ st.markdown("""
         overflow: hidden;
     }
     
+    .kpi-grid {
+        display: grid;
+        grid-template-columns: repeat(2, minmax(0, 1fr));
+        column-gap: 1rem;
+    }
+    
     .kpi-card::before {
         content: '';
         position: absolute;
@@ -272,32 +272,6 @@ st.markdown("""
         gap: 0.5rem;
     }
     
-    /* Status indicators */
-    .status-container {
-        display: flex;
-        align-items: center;
-        justify-content: space-between;
-        gap: 1rem;
-        padding: 1.5rem;
-        background: var(--background-white);
-        border-radius: 12px;
-        border: 1px solid var(--border-light);
-        box-shadow: var(--shadow-md);
-        margin-bottom: 1rem;
-    }
-    
-    .status-indicator {
-        width: 12px;
-        height: 12px;
-        border-radius: 50%;
-        margin-right: 12px;
-        box-shadow: 0 0 0 2px rgba(255,255,255,0.8);
-    }
-    
-    .status-green { background-color: var(--success-color); }
-    .status-orange { background-color: var(--warning-color); }
-    .status-red { background-color: var(--error-color); }
-    
     /* Alertas */
     .alert {
         padding: 1.5rem 2rem;
@@ -379,17 +353,26 @@ st.markdown("""
         .main-header h1 { font-size: 2rem; }
         .main-header h2 { font-size: 1.5rem; }
         .kpi-card { padding: 1.5rem 1rem; }
+        .kpi-grid { grid-template-columns: 1fr; }
         .section-header { padding: 1rem 1.5rem; }
     }
 </style>
-""", unsafe_allow_html=True)
+"""
+
+@st.cache_data
+def get_page_css():
+    """CSS compactado (sin comentarios ni espacios redundantes); se calcula una vez por proceso."""
+    css = re.sub(r'/\*.*?\*/', '', PAGE_CSS, flags=re.S)
+    return re.sub(r'\s+', ' ', css).strip()
+
+# Se emite en cada ejecución: Streamlit elimina los elementos que no se vuelven a pintar
+st.markdown(get_page_css(), unsafe_allow_html=True)
 
 # ================================================================
 # INICIALIZACIÓN DEL CONTROLADOR
 # ================================================================
-@st.cache_resource
 def init_controller():
-    """Inicializa el controlador con cache."""
+    """Crea el controlador (singleton por sesión, guardado en session_state)."""
     if controller_available and GarlicRRHHController:
         return GarlicRRHHController()
     return None
@@ -402,8 +385,21 @@ controller = st.session_state.garlic_controller
 # ================================================================
 # FUNCIONES DE UTILIDAD
 # ================================================================
+def get_update_timestamp():
+    """
+    Marca temporal de la última carga, fijada al inicio de la sesión.
+    
+    Solo cambia al cargar datos nuevos, de modo que el HTML de la alerta
+    de período es idéntico entre ejecuciones.
+    """
+    if 'load_ts' not in st.session_state:
+        st.session_state.load_ts = datetime.now()
+    return st.session_state.load_ts.strftime('%d/%m/%Y %H:%M')
+
 def export_to_excel(data, filename):
     """Exporta datos a Excel con formato profesional."""
+    # Importación diferida: solo se paga cuando se exporta
+    import io
     output = io.BytesIO()
     try:
         with pd.ExcelWriter(output, engine='openpyxl') as writer:
@@ -416,261 +412,570 @@ def export_to_excel(data, filename):
         st.error(f"Error generando Excel: {str(e)}")
         return None
 
-def display_kpi_card(title, main_value, sub_values, card_type="default"):
-    """Muestra una KPI card con formato específico."""
-    card_class = f"kpi-card kpi-card-{card_type}"
+# Plantillas HTML de las KPI cards
+KPI_SUB_VALUE_TPL = '<div class="metric-value-small"><strong>{0}:</strong> {1}</div>'
+KPI_CARD_TPL = (
+    '<div class="kpi-card kpi-card-{card_type}"><div class="metric-container">'
+    '<div class="metric-title">{title}</div>'
+    '<div class="metric-value-large">{main_value}</div>{sub_values}</div></div>'
+)
+
+def kpi_card_html(title, main_value, sub_values, card_type="default"):
+    """Devuelve el HTML de una KPI card."""
+    return KPI_CARD_TPL.format(
+        card_type=card_type,
+        title=title,
+        main_value=main_value,
+        sub_values="".join(KPI_SUB_VALUE_TPL.format(label, value) for label, value in sub_values)
+    )
+
+def display_kpi_cards(cards):
+    """Muestra varias KPI cards en una rejilla de dos columnas con un único st.markdown."""
+    html = "".join(kpi_card_html(*card) for card in cards)
+    st.markdown(f'<div class="kpi-grid">{html}</div>', unsafe_allow_html=True)
+
+def detect_data_type(data):
+    """Detecta si los datos están parseados o son raw."""
+    if data is None:
+        return 'none', 'Datos son None'
+    elif isinstance(data, str):
+        return 'error_string', f'String error: {data[:100]}...'
+    elif isinstance(data, dict):
+        # ¿Es un resultado parseado?
+        if 'status' in data and 'message' in data and 'data' in data:
+            return 'parsed', f"Datos ya parseados (status: {data.get('status')})"
+        # ¿Es dict de DataFrames raw? (se inspecciona solo el primer valor;
+        # el parser valida el resto de hojas)
+        first = next(iter(data.values()), None)
+        if isinstance(first, pd.DataFrame):
+            return 'raw_excel', f'Dict con {len(data)} DataFrames raw'
+        return 'unknown_dict', f'Dict desconocido con claves: {list(data.keys())}'
+    elif isinstance(data, pd.DataFrame):
+        return 'raw_dataframe', f'DataFrame raw con shape {data.shape}'
+    else:
+        return 'unknown', f'Tipo desconocido: {type(data)}'
+
+@st.cache_data(ttl=3600, show_spinner=False)
+def load_and_parse(resource_key):
+    """
+    Descarga el Excel desde SharePoint, detecta su tipo y, si es raw, lo parsea.
     
-    sub_values_html = ""
-    for label, value in sub_values:
-        sub_values_html += f'<div class="metric-value-small"><strong>{label}:</strong> {value}</div>'
+    Returns:
+        Tupla (data_type, description, data); para datos raw, data es el
+        resultado de parse_excel.
+    """
+    excel_data = get_dataframe(resource_key)
+    data_type, description = detect_data_type(excel_data)
     
-    st.markdown(f"""
-    <div class="{card_class}">
-        <div class="metric-container">
-            <div class="metric-title">{title}</div>
-            <div class="metric-value-large">{main_value}</div>
-            {sub_values_html}
-        </div>
-    </div>
-    """, unsafe_allow_html=True)
+    if data_type in ('raw_excel', 'raw_dataframe') and parser_available and parse_excel:
+        if data_type == 'raw_dataframe':
+            excel_data = {'Sheet1': excel_data}
+        try:
+            excel_data = parse_excel(excel_data)
+        except Exception as e:
+            excel_data = {'status': 'error', 'message': f'Excepción parseando datos: {e}'}
+    
+    return data_type, description, excel_data
 
 # ================================================================
 # HEADER PRINCIPAL
 # ================================================================
-st.markdown("""
+HEADER_HTML = """
 <div class="main-header">
     <h1>🧄 Dashboard Recursos Humanos</h1>
     <h2>Garlic & Beyond - Análisis Integral de Personal</h2>
     <p>Sistema avanzado de gestión y análisis de costes de personal por departamento</p>
 </div>
-""", unsafe_allow_html=True)
+"""
+
+st.markdown(HEADER_HTML, unsafe_allow_html=True)
 
 # ================================================================
 # INFORMACIÓN DE PERÍODO
 # ================================================================
-st.markdown("""
+# Plantillas precompiladas; en cada ejecución solo se sustituyen los valores
+PERIOD_ALERT_TPL = Template("""
 <div class="alert alert-info">
     <strong>📅 Período de Análisis:</strong> Enero - Diciembre 2025 (12 meses) | 
-    <strong>🔄 Última Actualización:</strong> """ + datetime.now().strftime('%d/%m/%Y %H:%M') + """
+    <strong>🔄 Última Actualización:</strong> <span>$ts</span>
 </div>
-""", unsafe_allow_html=True)
+""")
+SECTION_HEADER_TPL = Template("""
+<div class="section-header">
+    <h3 class="section-title">$title</h3>
+</div>
+""")
+ALERT_TPL = Template("""
+<div class="alert alert-$type">
+    <strong>$title</strong><br>
+    $message
+</div>
+""")
+
+def display_section_header(title):
+    """Muestra una cabecera de sección a partir de la plantilla común."""
+    st.markdown(SECTION_HEADER_TPL.substitute(title=title), unsafe_allow_html=True)
+
+st.markdown(PERIOD_ALERT_TPL.substitute(ts=get_update_timestamp()), unsafe_allow_html=True)
 
 # ================================================================
 # PANEL DE CONTROL CON LÓGICA DE CARGA INTELIGENTE
 # ================================================================
-col1, col2, col3 = st.columns([2, 1, 1])
+NO_MONTHS_PROCESSED_MD = """
+⚠️ **Ningún mes se pudo procesar**
 
-with col1:
-    if controller:
-        status = controller.get_status()
-        if status['initialized']:
-            st.markdown(f"""
-            <div class="status-container">
-                <div style="display: flex; align-items: center;">
-                    <span class="status-indicator status-green"></span>
-                    <strong>✅ Sistema Activo:</strong> {status['months_with_data']} meses con datos, {status['months_empty']} pendientes
-                </div>
-                <div style="color: var(--text-secondary); font-size: 0.9rem;">
-                    👥 {status['total_employees_latest']} empleados | 💰 €{status['total_cost_latest']:,.0f} | 
-                    🚨 {status['alerts_count']} alertas | 📅 {status['last_update']}
-                </div>
-            </div>
-            """, unsafe_allow_html=True)
+**Posibles causas:**
+- Nombres de hojas incorrectos (deben ser 'enero', 'febrero', etc.)
+- Hojas vacías (meses futuros sin datos)
+- Estructura Excel incorrecta (falta fila 'Total:')
+- Hojas omitidas por configuración
+"""
+
+def initialize_controller_if_changed(controller, parsed_data, force=False):
+    """
+    Inicializa el controlador solo si los datos han cambiado.
+    
+    La huella (status + meses procesados + marca de tiempo del parseo) se guarda
+    en session_state; reutilizar el mismo resultado parseado con el controlador
+    ya inicializado no rehace los cálculos, pero un nuevo parseo sí reinicializa.
+    """
+    metadata = parsed_data.get('metadata', {})
+    fp = hash((
+        parsed_data.get('status'),
+        tuple(metadata.get('processed_months', [])),
+        metadata.get('timestamp')
+    ))
+    if not force and st.session_state.get('_controller_fp') == fp and controller.get_status()['initialized']:
+        return True
+    if controller.initialize_with_data(parsed_data):
+        st.session_state['_controller_fp'] = fp
+        # Nueva versión de datos: invalida las consultas memoizadas del controlador
+        st.session_state['data_version'] = uuid.uuid4().hex
+        st.session_state.load_ts = datetime.now()
+        return True
+    return False
+
+@st.fragment
+def render_control_panel(controller):
+    """
+    Panel de control (estado + carga desde SharePoint).
+    
+    Es un fragment: sus botones solo re-ejecutan este bloque; tras una carga
+    correcta se fuerza st.rerun(scope="app") para refrescar el dashboard.
+    """
+    col1, col2, col3 = st.columns([2, 1, 1])
+
+    with col1:
+        if controller:
+            status = controller.get_status()
+            # Elementos nativos: Streamlit los compara estructuralmente entre ejecuciones
+            with st.container(border=True):
+                if status['initialized']:
+                    st.markdown(
+                        f"🟢 **Sistema Activo:** {status['months_with_data']} meses con datos, "
+                        f"{status['months_empty']} pendientes"
+                    )
+                    st.caption(
+                        f"👥 {status['total_employees_latest']} empleados | "
+                        f"💰 €{status['total_cost_latest']:,.0f} | "
+                        f"🚨 {status['alerts_count']} alertas | 📅 {status['last_update']}"
+                    )
+                else:
+                    st.markdown("🔴 **Sistema Inactivo:** Datos no cargados")
         else:
-            st.markdown("""
-            <div class="status-container">
-                <div style="display: flex; align-items: center;">
-                    <span class="status-indicator status-red"></span>
-                    <strong>❌ Sistema Inactivo:</strong> Datos no cargados
-                </div>
-            </div>
-            """, unsafe_allow_html=True)
-    else:
-        st.error("❌ Controlador no disponible")
-
-with col2:
-    if st.button("🔄 Cargar desde SharePoint", help="Cargar datos reales desde SharePoint"):
-        with st.spinner("Cargando datos desde SharePoint..."):
-            try:
-                if excel_available and get_dataframe:
-                    # LÓGICA DE CARGA INTELIGENTE - DETECTA AUTOMÁTICAMENTE EL TIPO DE DATOS
+            st.error("❌ Controlador no disponible")
+
+    with col2:
+        force_refresh = st.checkbox("Forzar recarga", help="Ignorar la caché y volver a descargar desde SharePoint")
+        if st.button("🔄 Cargar desde SharePoint", help="Cargar datos reales desde SharePoint"):
+            with st.spinner("Cargando datos desde SharePoint..."):
+                try:
+                    if excel_available and get_dataframe:
+                        # LÓGICA DE CARGA INTELIGENTE - DETECTA AUTOMÁTICAMENTE EL TIPO DE DATOS
+                        if force_refresh:
+                            load_and_parse.clear()
                     
-                    # Obtener datos desde SharePoint
-                    st.info("📥 Descargando datos desde SharePoint...")
-                    excel_data = get_dataframe('KCTN_02_RRHH')
+                        # Obtener (y parsear si son raw) datos desde SharePoint, con caché
+                        st.info("📥 Descargando datos desde SharePoint...")
+                        data_type, description, excel_data = load_and_parse('KCTN_02_RRHH')
+                        st.success(f"✅ Tipo detectado: {data_type}")
                     
-                    # DETECCIÓN INTELIGENTE: ¿Los datos ya están parseados o son raw?
-                    def detect_data_type(data):
-                        """Detecta si los datos están parseados o son raw."""
-                        if data is None:
-                            return 'none', 'Datos son None'
-                        elif isinstance(data, str):
-                            return 'error_string', f'String error: {data[:100]}...'
-                        elif isinstance(data, dict):
-                            # ¿Es un resultado parseado?
-                            if 'status' in data and 'message' in data and 'data' in data:
-                                return 'parsed', f"Datos ya parseados (status: {data.get('status')})"
-                            # ¿Es dict de DataFrames raw?
-                            elif all(isinstance(v, pd.DataFrame) for v in data.values()):
-                                return 'raw_excel', f'Dict con {len(data)} DataFrames raw'
-                            else:
-                                return 'unknown_dict', f'Dict desconocido con claves: {list(data.keys())}'
-                        elif isinstance(data, pd.DataFrame):
-                            return 'raw_dataframe', f'DataFrame raw con shape {data.shape}'
-                        else:
-                            return 'unknown', f'Tipo desconocido: {type(data)}'
+                        # No conservar en caché resultados fallidos
+                        if not (isinstance(excel_data, dict) and excel_data.get('status') == 'success'):
+                            load_and_parse.clear()
                     
-                    # Detectar tipo de datos recibidos
-                    data_type, description = detect_data_type(excel_data)
-                    st.success(f"✅ Tipo detectado: {data_type}")
+                        # Procesar según el tipo detectado
+                        if data_type == 'none':
+                            st.error("❌ No se pudieron obtener datos de SharePoint")
+                            st.markdown("""
+                            **Posibles causas:**
+                            - Error de conectividad con SharePoint  
+                            - URL incorrecta en secrets.toml
+                            - Credenciales incorrectas
+                            - Archivo no encontrado
+                            """)
                     
-                    # Procesar según el tipo detectado
-                    if data_type == 'none':
-                        st.error("❌ No se pudieron obtener datos de SharePoint")
-                        st.markdown("""
-                        **Posibles causas:**
-                        - Error de conectividad con SharePoint  
-                        - URL incorrecta en secrets.toml
-                        - Credenciales incorrectas
-                        - Archivo no encontrado
-                        """)
+                        elif data_type == 'error_string':
+                            st.error("❌ SharePoint devolvió un mensaje de error:")
+                            with st.expander("📄 Mensaje completo"):
+                                st.code(excel_data)
+                            st.markdown("""
+                            **Soluciones:**
+                            1. Verificar URL del archivo en secrets.toml
+                            2. Comprobar credenciales de SharePoint  
+                            3. Verificar permisos de acceso al archivo
+                            4. Comprobar que el archivo existe
+                            """)
                     
-                    elif data_type == 'error_string':
-                        st.error("❌ SharePoint devolvió un mensaje de error:")
-                        with st.expander("📄 Mensaje completo"):
-                            st.code(excel_data)
-                        st.markdown("""
-                        **Soluciones:**
-                        1. Verificar URL del archivo en secrets.toml
-                        2. Comprobar credenciales de SharePoint  
-                        3. Verificar permisos de acceso al archivo
-                        4. Comprobar que el archivo existe
-                        """)
-                    
-                    elif data_type == 'parsed':
-                        # ¡ESTE ES EL CASO PRINCIPAL! Los datos ya están parseados
-                        st.success("🎉 Datos ya parseados por excel_loader - inicializando directamente")
+                        elif data_type == 'parsed':
+                            # ¡ESTE ES EL CASO PRINCIPAL! Los datos ya están parseados
+                            st.success("🎉 Datos ya parseados por excel_loader - inicializando directamente")
                         
-                        # Verificar el status de los datos parseados
-                        if excel_data.get('status') == 'success':
-                            # Inicializar controlador directamente con datos parseados
-                            if controller and controller.initialize_with_data(excel_data):
-                                st.success("✅ Datos cargados correctamente desde SharePoint")
-                                st.balloons()
+                            # Verificar el status de los datos parseados
+                            if excel_data.get('status') == 'success':
+                                # Inicializar controlador directamente con datos parseados
+                                if controller and initialize_controller_if_changed(controller, excel_data, force_refresh):
+                                    st.success("✅ Datos cargados correctamente desde SharePoint")
+                                    st.balloons()
                                 
-                                # Mostrar resumen de datos cargados
-                                metadata = excel_data.get('metadata', {})
-                                st.info(f"📊 Meses procesados: {len(metadata.get('processed_months', []))}")
-                                if metadata.get('processed_months'):
-                                    st.write(f"Meses: {', '.join(metadata['processed_months'])}")
+                                    # Mostrar resumen de datos cargados
+                                    metadata = excel_data.get('metadata', {})
+                                    st.info(f"📊 Meses procesados: {len(metadata.get('processed_months', []))}")
+                                    if metadata.get('processed_months'):
+                                        st.write(f"Meses: {', '.join(metadata['processed_months'])}")
                                 
-                                st.rerun()
-                            else:
-                                st.error("❌ Error inicializando controlador con datos parseados")
+                                    st.rerun(scope="app")
+                                else:
+                                    st.error("❌ Error inicializando controlador con datos parseados")
                         
-                        elif excel_data.get('status') == 'error':
-                            st.error(f"❌ Error en datos parseados: {excel_data.get('message')}")
+                            elif excel_data.get('status') == 'error':
+                                st.error(f"❌ Error en datos parseados: {excel_data.get('message')}")
                             
-                            # Mostrar detalles del error
-                            metadata = excel_data.get('metadata', {})
+                                # Mostrar detalles del error (texto agrupado en un único markdown)
+                                metadata = excel_data.get('metadata', {})
+                                details = []
                             
-                            if 'errors' in metadata and metadata['errors']:
-                                st.markdown("**Errores específicos:**")
-                                for error in metadata['errors'][:5]:
-                                    st.error(f"• {error}")
+                                if metadata.get('errors'):
+                                    details.append("**Errores específicos:**  \n" + "  \n".join(
+                                        f"• {error}" for error in metadata['errors'][:5]
+                                    ))
                             
-                            if 'sheet_analysis' in metadata:
-                                st.markdown("**Análisis de hojas Excel:**")
-                                analysis_df = pd.DataFrame(metadata['sheet_analysis'])
-                                st.dataframe(analysis_df, use_container_width=True)
+                                # Sugerir soluciones basadas en el análisis
+                                if metadata.get('processed_months', []):
+                                    details.append(f"✅ Algunos meses sí se procesaron: {metadata['processed_months']}")
+                                else:
+                                    details.append(NO_MONTHS_PROCESSED_MD)
                             
-                            # Sugerir soluciones basadas en el análisis
-                            if metadata.get('processed_months', []):
-                                st.info(f"✅ Algunos meses sí se procesaron: {metadata['processed_months']}")
-                            else:
-                                st.warning("""
-                                ⚠️ **Ningún mes se pudo procesar**
+                                with st.expander("Detalles del error", expanded=True):
+                                    st.markdown("\n\n".join(details))
                                 
-                                **Posibles causas:**
-                                - Nombres de hojas incorrectos (deben ser 'enero', 'febrero', etc.)
-                                - Hojas vacías (meses futuros sin datos)
-                                - Estructura Excel incorrecta (falta fila 'Total:')
-                                - Hojas omitidas por configuración
-                                """)
+                                    if 'sheet_analysis' in metadata:
+                                        st.markdown("**Análisis de hojas Excel:**")
+                                        analysis_df = pd.DataFrame.from_records(metadata['sheet_analysis'])
+                                        st.dataframe(analysis_df, use_container_width=True, hide_index=True)
                         
-                        else:
-                            st.warning(f"⚠️ Status desconocido en datos parseados: {excel_data.get('status')}")
+                            else:
+                                st.warning(f"⚠️ Status desconocido en datos parseados: {excel_data.get('status')}")
                     
-                    elif data_type == 'raw_excel':
-                        # Datos raw de Excel - necesitan parsing manual
-                        st.info("⚙️ Datos raw detectados - parseando manualmente...")
+                        elif data_type in ('raw_excel', 'raw_dataframe'):
+                            # Datos raw - ya parseados dentro de load_and_parse
+                            if data_type == 'raw_excel':
+                                st.info("⚙️ Datos raw detectados - parseando manualmente...")
+                            else:
+                                st.info("📋 DataFrame simple detectado - procesando...")
                         
-                        if parser_available and parse_excel:
-                            try:
-                                parsed_data = parse_excel(excel_data)
-                                
+                            if parser_available and parse_excel:
+                                parsed_data = excel_data
+                            
                                 if parsed_data and parsed_data.get('status') == 'success':
-                                    if controller and controller.initialize_with_data(parsed_data):
+                                    if controller and initialize_controller_if_changed(controller, parsed_data, force_refresh):
                                         st.success("✅ Datos raw parseados y cargados correctamente")
-                                        st.rerun()
+                                        st.rerun(scope="app")
                                     else:
                                         st.error("❌ Error inicializando controlador")
                                 else:
                                     error_msg = parsed_data.get('message', 'Error desconocido') if parsed_data else 'Sin respuesta del parser'
                                     st.error(f"❌ Error parseando datos raw: {error_msg}")
-                            
-                            except Exception as e:
-                                st.error(f"❌ Excepción parseando datos raw: {e}")
-                        else:
-                            st.error("❌ Parser no disponible para datos raw")
+                            else:
+                                st.error("❌ Parser no disponible para datos raw")
                     
-                    elif data_type == 'raw_dataframe':
-                        # DataFrame simple - convertir y parsear
-                        st.info("📋 DataFrame simple detectado - procesando...")
-                        
-                        excel_dict = {'Sheet1': excel_data}
-                        
-                        if parser_available and parse_excel:
-                            try:
-                                parsed_data = parse_excel(excel_dict)
-                                
-                                if parsed_data and parsed_data.get('status') == 'success':
-                                    if controller and controller.initialize_with_data(parsed_data):
-                                        st.success("✅ DataFrame procesado correctamente")
-                                        st.rerun()
-                                    else:
-                                        st.error("❌ Error inicializando controlador")
-                                else:
-                                    st.error(f"❌ Error parseando DataFrame: {parsed_data.get('message') if parsed_data else 'Sin respuesta'}")
-                            
-                            except Exception as e:
-                                st.error(f"❌ Error procesando DataFrame: {e}")
                         else:
-                            st.error("❌ Parser no disponible")
-                    
-                    else:
-                        # Tipo desconocido
-                        st.error(f"❌ Tipo de datos no soportado: {data_type}")
-                        st.write(f"Descripción: {description}")
+                            # Tipo desconocido
+                            st.error(f"❌ Tipo de datos no soportado: {data_type}")
+                            st.write(f"Descripción: {description}")
                         
-                        # Intentar mostrar más información
-                        if isinstance(excel_data, dict):
-                            st.write("Claves del dict:")
-                            for key, value in excel_data.items():
-                                st.write(f"  • {key}: {type(value)}")
+                            # Intentar mostrar más información
+                            if isinstance(excel_data, dict):
+                                st.write("Claves del dict:")
+                                for key, value in excel_data.items():
+                                    st.write(f"  • {key}: {type(value)}")
                 
-                else:
-                    st.error("❌ Módulos no disponibles")
-                    st.write(f"Excel loader available: {excel_available}")
-                    st.write(f"Get dataframe function: {get_dataframe is not None}")
+                    else:
+                        st.error("❌ Módulos no disponibles")
+                        st.write(f"Excel loader available: {excel_available}")
+                        st.write(f"Get dataframe function: {get_dataframe is not None}")
                     
-            except Exception as e:
-                st.error(f"❌ Error crítico durante carga: {e}")
-                st.exception(e)
+                except Exception as e:
+                    st.error(f"❌ Error crítico durante carga: {type(e).__name__}: {e}")
+                    with st.expander("Traceback", expanded=False):
+                        st.code("".join(traceback.format_exception(type(e), e, e.__traceback__)))
+
+    with col3:
+        # Popover: se abre en el cliente sin re-ejecutar el script
+        with st.popover("📁 Subir Excel Local", help="Subir archivo Excel desde tu computadora"):
+            st.info("🔄 Funcionalidad próximamente disponible")
+
+render_control_panel(controller)
+
+# ================================================================
+# CONSULTAS AL CONTROLADOR MEMOIZADAS POR VERSIÓN DE DATOS
+# ================================================================
+# El controlador (_controller) no se hashea; la clave es la versión de datos
+# asignada al cargar el Excel más el mes o la tupla de meses consultada.
+@st.cache_data(ttl=300, show_spinner=False)
+def get_cached_months_with_data(data_version, _controller):
+    """Meses con datos (memoizados)."""
+    return _controller.get_months_with_data()
+
+@st.cache_data(ttl=300, show_spinner=False)
+def get_cached_monthly_kpis(data_version, month, _controller):
+    """KPIs de un mes (memoizados)."""
+    return _controller.get_monthly_kpis(month)
+
+@st.cache_data(ttl=300, show_spinner=False)
+def get_cached_alerts(data_version, _controller):
+    """Alertas activas (memoizadas)."""
+    return _controller.get_alerts()
+
+@st.cache_data(ttl=300, show_spinner=False)
+def get_cached_bajas_data(data_version, month, _controller):
+    """Análisis de bajas de un mes (memoizado)."""
+    return _controller.get_analisis_bajas_data(month)
+
+@st.cache_data(ttl=300, show_spinner=False)
+def get_cached_kpi_table(data_version, months, _controller):
+    """Tabla comparativa de KPIs para una tupla de meses (memoizada)."""
+    return _controller.create_multi_month_kpi_table(list(months))
+
+@st.cache_data(ttl=300, show_spinner=False)
+def get_cached_kpi_table_csv(data_version, months, _kpi_table):
+    """CSV de la tabla comparativa (memoizado con la misma clave que la tabla)."""
+    return _kpi_table.to_csv(index=False).encode('utf-8')
+
+@st.cache_data(ttl=300, show_spinner=False)
+def get_cached_figure(data_version, chart_method, key, _controller):
+    """
+    Figura Plotly de un método create_*_chart del controlador (memoizada).
+    
+    key es el mes (str) o la tupla de meses; se devuelve como dict, que
+    st.plotly_chart acepta directamente y es más barato de copiar en caché.
+    """
+    months = list(key) if isinstance(key, tuple) else key
+    return getattr(_controller, chart_method)(months).to_dict()
+
+data_version = st.session_state.get('data_version')
+
+# ================================================================
+# VISTAS DE ANÁLISIS (FRAGMENTS)
+# ================================================================
+# Cada vista es un fragment: sus widgets (toggles de gráficos, descarga)
+# solo re-ejecutan la vista. Los filtros de la barra lateral quedan fuera
+# porque un fragment no puede escribir en st.sidebar.
+@st.fragment
+def render_individual_analysis(controller, data_version, selected_month):
+    """Vista de análisis individual de un mes."""
+    # Obtener KPIs del mes seleccionado
+    kpis = get_cached_monthly_kpis(data_version, selected_month, controller)
+    
+    # Mostrar alertas si las hay
+    alerts = get_cached_alerts(data_version, controller)
+    if alerts:
+        st.markdown("".join(
+            ALERT_TPL.substitute(
+                type=alert.get('type', 'info'),
+                title=alert.get('title', ''),
+                message=alert.get('message', '')
+            )
+            for alert in alerts
+        ), unsafe_allow_html=True)
+    
+    # ================================================================
+    # SECCIÓN 1: KPI CARDS (4 cards según especificaciones)
+    # ================================================================
+    display_section_header(f"📊 KPIs Principales - {selected_month}")
+    
+    # Mostrar mensaje si no hay datos
+    if not kpis['has_data']:
+        st.info(f"📅 {selected_month} - Datos pendientes de cargar")
+    
+    # 4 KPI Cards en 2 filas (un único st.markdown)
+    display_kpi_cards([
+        # KPI Card 1: Coste Personal Fijo
+        (
+            "💼 Coste Personal Fijo",
+            f"€{kpis['fijo_coste_mes']:,.0f}",
+            [
+                ("Coste/Día", f"€{kpis['fijo_coste_dia']:,.0f}"),
+                ("Coste/Hora", f"€{kpis['fijo_coste_hora']:,.0f}"),
+                ("H/PAX", f"{kpis['fijo_hpax']:,.2f}")
+            ],
+            "fijo"
+        ),
+        # KPI Card 2: Coste Personal Producción
+        (
+            "🏭 Coste Personal Producción",
+            f"€{kpis['produccion_coste_mes']:,.0f}",
+            [
+                ("Coste/Día", f"€{kpis['produccion_coste_dia']:,.0f}"),
+                ("Coste/Hora", f"€{kpis['produccion_coste_hora']:,.0f}"),
+                ("H/PAX", f"{kpis['produccion_hpax']:,.2f}")
+            ],
+            "produccion"
+        ),
+        # KPI Card 3: Bajas
+        (
+            "🏥 Análisis de Bajas",
+            f"€{kpis['bajas_coste_total']:,.0f}",
+            [
+                ("Número de Bajas", f"{kpis['bajas_numero']} empleados"),
+                ("% del Total", f"{kpis['bajas_porcentaje']:.1f}%"),
+                ("Total Empleados", f"{kpis['total_empleados']} empleados")
+            ],
+            "bajas"
+        ),
+        # KPI Card 4: Gasto Personal Total
+        (
+            "💰 Gasto Personal Total",
+            f"€{kpis['total_coste_mes']:,.0f}",
+            [
+                ("Coste/Día", f"€{kpis['total_coste_dia']:,.0f}"),
+                ("Coste/Hora", f"€{kpis['total_coste_hora']:,.0f}"),
+                ("Empleados Totales", f"{kpis['total_empleados']} empleados")
+            ],
+            "total"
+        )
+    ])
+    
+    # ================================================================
+    # SECCIÓN 2: GRÁFICOS INDIVIDUALES
+    # ================================================================
+    display_section_header(f"📈 Análisis Gráfico - {selected_month}")
+    
+    # Sin datos: no se construyen figuras vacías
+    if not kpis['has_data']:
+        st.info(f"📊 Sin datos que graficar para {selected_month}")
+    else:
+        col1, col2 = st.columns(2)
+        
+        with col1:
+            # 1. Costes Por Sección (gráfico de barras)
+            st.subheader("💰 Costes por Sección")
+            fig_costes_seccion = get_cached_figure(data_version, 'create_costes_por_seccion_chart', selected_month, controller)
+            st.plotly_chart(fig_costes_seccion, use_container_width=True, key="plot_costes_seccion")
+        
+        with col2:
+            # 2. Pie Chart de Secciones (count empleados por sección)
+            # Gráfico secundario: solo se construye si el usuario lo pide
+            st.subheader("👥 Distribución de Empleados")
+            if st.toggle("Mostrar gráfico", key="show_pie"):
+                fig_pie_secciones = get_cached_figure(data_version, 'create_pie_chart_secciones', selected_month, controller)
+                st.plotly_chart(fig_pie_secciones, use_container_width=True, key="plot_pie_secciones")
+    
+    # ================================================================
+    # SECCIÓN 3: ANÁLISIS DE BAJAS DETALLADO
+    # ================================================================
+    display_section_header(f"🏥 Análisis Detallado de Bajas - {selected_month}")
+    
+    bajas_data = get_cached_bajas_data(data_version, selected_month, controller)
+    
+    if bajas_data['cantidad_bajas'] > 0:
+        col1, col2 = st.columns([1, 2])
+        
+        with col1:
+            st.markdown(f"""
+            **📊 Resumen de Bajas:**
+            
+            - **Cantidad de bajas:** {bajas_data['cantidad_bajas']} empleados
+            - **Coste total de bajas:** €{bajas_data['coste_total_bajas']:,.0f}
+            - **% sobre coste total:** {bajas_data['porcentaje_coste_bajas']:.1f}%
+            """)
+        
+        with col2:
+            if bajas_data['empleados_baja']['nombre']:
+                st.markdown("**📋 Lista de Empleados de Baja:**")
+                
+                # Valores numéricos; el formato solo se aplica al mostrar (Styler)
+                bajas_df = pd.DataFrame(bajas_data['empleados_baja']).rename(columns={
+                    'nombre': 'Nombre', 'seccion': 'Sección',
+                    'coste': 'Coste', 'porcentaje_coste': '% del Total'
+                })
+                bajas_styler = bajas_df.style.format({'Coste': '€{:,.0f}', '% del Total': '{:.1f}%'})
+                
+                st.dataframe(bajas_styler, use_container_width=True, hide_index=True)
+    else:
+        st.success(f"🎉 No hay empleados de baja en {selected_month}")
+
+@st.fragment
+def render_multi_month_analysis(controller, data_version, selected_months):
+    """Vista de comparación entre varios meses."""
+    if not selected_months:
+        st.warning("⚠️ Selecciona al menos un mes para comparar")
+    else:
+        # ================================================================
+        # SECCIÓN 1: TABLA DE KPIs COMPARATIVA
+        # ================================================================
+        display_section_header("📊 Tabla Comparativa de KPIs")
+        
+        months_key = tuple(selected_months)
+        kpi_table = get_cached_kpi_table(data_version, months_key, controller)
+        
+        if not kpi_table.empty:
+            # Tabla ya memoizada; la clave estable mantiene el mismo componente entre ejecuciones
+            st.dataframe(
+                kpi_table, 
+                use_container_width=True, 
+                hide_index=True,
+                height=600,
+                key="kpi_table_multi_mes"
+            )
+            
+            # Botón de descarga
+            csv_data = get_cached_kpi_table_csv(data_version, months_key, kpi_table)
+            st.download_button(
+                label="📄 Descargar Tabla KPIs",
+                data=csv_data,
+                file_name=f"KPIs_Comparativa_{datetime.now().strftime('%Y%m%d')}.csv",
+                mime="text/csv"
+            )
+        else:
+            st.warning("No hay datos disponibles para generar la tabla comparativa")
+        
+        # ================================================================
+        # SECCIÓN 2: GRÁFICOS COMPARATIVOS
+        # ================================================================
+        display_section_header("📈 Análisis Comparativo entre Meses")
+        
+        # 1. Evolución de Costes (líneas de mes, día, hora)
+        st.subheader("📈 Evolución de Costes Totales")
+        fig_evolucion = get_cached_figure(data_version, 'create_evolucion_costes_chart', months_key, controller)
+        st.plotly_chart(fig_evolucion, use_container_width=True, key="plot_evolucion")
+        
+        # Gráficos secundarios: solo se construyen si el usuario los pide
+        if st.toggle("Mostrar gráficos detallados", key="show_detail_charts"):
+            col1, col2 = st.columns(2)
+            
+            with col1:
+                # 2. Costes por Sección Comparativo (barras agrupadas)
+                st.subheader("📊 Comparación Costes por Sección")
+                fig_seccion_comp = get_cached_figure(data_version, 'create_costes_seccion_comparativo_chart', months_key, controller)
+                st.plotly_chart(fig_seccion_comp, use_container_width=True, key="plot_seccion_comp")
+            
+            with col2:
+                # 3. Tendencia de Bajas
+                st.subheader("🏥 Tendencia de Bajas")
+                fig_bajas_tendencia = get_cached_figure(data_version, 'create_bajas_tendencia_chart', months_key, controller)
+                st.plotly_chart(fig_bajas_tendencia, use_container_width=True, key="plot_bajas_tendencia")
 
-with col3:
-    if st.button("📁 Subir Excel Local", help="Subir archivo Excel desde tu computadora"):
-        st.info("🔄 Funcionalidad próximamente disponible")
 
 # ================================================================
 # CONTENIDO PRINCIPAL - SOLO SI HAY CONTROLADOR INICIALIZADO
@@ -693,22 +998,23 @@ if controller and controller.is_initialized:
         if analysis_mode == "📊 Análisis Individual":
             st.markdown("### 📅 Análisis Individual")
             available_months = controller.get_available_months()
+            months_with_data = get_cached_months_with_data(data_version, controller)
             selected_month = st.selectbox(
                 "**Seleccionar Mes:**", 
                 available_months, 
-                index=len(controller.get_months_with_data())-1 if controller.get_months_with_data() else 0,
+                index=len(months_with_data)-1 if months_with_data else 0,
                 help="Selecciona el mes para análisis detallado"
             )
             
         else:
             st.markdown("### 📈 Comparación Multi-mes")
-            available_months = controller.get_available_months()
-            months_with_data = controller.get_months_with_data()
+            months_with_data = get_cached_months_with_data(data_version, controller)
             
+            # Solo se ofrecen los meses con datos
             selected_months = st.multiselect(
                 "**Meses a Comparar:**",
-                available_months,
-                default=months_with_data[-6:] if len(months_with_data) >= 6 else months_with_data,
+                months_with_data,
+                default=months_with_data[-6:],
                 help="Selecciona múltiples meses para comparar"
             )
         
@@ -719,224 +1025,19 @@ if controller and controller.is_initialized:
     # ANÁLISIS INDIVIDUAL
     # ================================================================
     if analysis_mode == "📊 Análisis Individual":
-        
-        # Obtener KPIs del mes seleccionado
-        kpis = controller.get_monthly_kpis(selected_month)
-        
-        # Mostrar alertas si las hay
-        alerts = controller.get_alerts()
-        for alert in alerts:
-            alert_class = f"alert-{alert.get('type', 'info')}"
-            st.markdown(f"""
-            <div class="alert {alert_class}">
-                <strong>{alert.get('title', '')}</strong><br>
-                {alert.get('message', '')}
-            </div>
-            """, unsafe_allow_html=True)
-        
-        # ================================================================
-        # SECCIÓN 1: KPI CARDS (4 cards según especificaciones)
-        # ================================================================
-        st.markdown("""
-        <div class="section-header">
-            <h3 class="section-title">📊 KPIs Principales - """ + selected_month + """</h3>
-        </div>
-        """, unsafe_allow_html=True)
-        
-        # Mostrar mensaje si no hay datos
-        if not kpis['has_data']:
-            st.info(f"📅 {selected_month} - Datos pendientes de cargar")
-        
-        # 4 KPI Cards en 2 filas
-        col1, col2 = st.columns(2)
-        
-        with col1:
-            # KPI Card 1: Coste Personal Fijo
-            display_kpi_card(
-                "💼 Coste Personal Fijo",
-                f"€{kpis['fijo_coste_mes']:,.0f}",
-                [
-                    ("Coste/Día", f"€{kpis['fijo_coste_dia']:,.0f}"),
-                    ("Coste/Hora", f"€{kpis['fijo_coste_hora']:,.0f}"),
-                    ("H/PAX", f"{kpis['fijo_hpax']:,.2f}")
-                ],
-                "fijo"
-            )
-        
-        with col2:
-            # KPI Card 2: Coste Personal Producción
-            display_kpi_card(
-                "🏭 Coste Personal Producción",
-                f"€{kpis['produccion_coste_mes']:,.0f}",
-                [
-                    ("Coste/Día", f"€{kpis['produccion_coste_dia']:,.0f}"),
-                    ("Coste/Hora", f"€{kpis['produccion_coste_hora']:,.0f}"),
-                    ("H/PAX", f"{kpis['produccion_hpax']:,.2f}")
-                ],
-                "produccion"
-            )
-        
-        col3, col4 = st.columns(2)
-        
-        with col3:
-            # KPI Card 3: Bajas
-            display_kpi_card(
-                "🏥 Análisis de Bajas",
-                f"€{kpis['bajas_coste_total']:,.0f}",
-                [
-                    ("Número de Bajas", f"{kpis['bajas_numero']} empleados"),
-                    ("% del Total", f"{kpis['bajas_porcentaje']:.1f}%"),
-                    ("Total Empleados", f"{kpis['total_empleados']} empleados")
-                ],
-                "bajas"
-            )
-        
-        with col4:
-            # KPI Card 4: Gasto Personal Total
-            display_kpi_card(
-                "💰 Gasto Personal Total",
-                f"€{kpis['total_coste_mes']:,.0f}",
-                [
-                    ("Coste/Día", f"€{kpis['total_coste_dia']:,.0f}"),
-                    ("Coste/Hora", f"€{kpis['total_coste_hora']:,.0f}"),
-                    ("Empleados Totales", f"{kpis['total_empleados']} empleados")
-                ],
-                "total"
-            )
-        
-        # ================================================================
-        # SECCIÓN 2: GRÁFICOS INDIVIDUALES
-        # ================================================================
-        st.markdown("""
-        <div class="section-header">
-            <h3 class="section-title">📈 Análisis Gráfico - """ + selected_month + """</h3>
-        </div>
-        """, unsafe_allow_html=True)
-        
-        col1, col2 = st.columns(2)
-        
-        with col1:
-            # 1. Costes Por Sección (gráfico de barras)
-            st.subheader("💰 Costes por Sección")
-            fig_costes_seccion = controller.create_costes_por_seccion_chart(selected_month)
-            st.plotly_chart(fig_costes_seccion, use_container_width=True)
-        
-        with col2:
-            # 2. Pie Chart de Secciones (count empleados por sección)
-            st.subheader("👥 Distribución de Empleados")
-            fig_pie_secciones = controller.create_pie_chart_secciones(selected_month)
-            st.plotly_chart(fig_pie_secciones, use_container_width=True)
-        
-        # ================================================================
-        # SECCIÓN 3: ANÁLISIS DE BAJAS DETALLADO
-        # ================================================================
-        st.markdown("""
-        <div class="section-header">
-            <h3 class="section-title">🏥 Análisis Detallado de Bajas - """ + selected_month + """</h3>
-        </div>
-        """, unsafe_allow_html=True)
-        
-        bajas_data = controller.get_analisis_bajas_data(selected_month)
-        
-        if bajas_data['cantidad_bajas'] > 0:
-            col1, col2 = st.columns([1, 2])
-            
-            with col1:
-                st.markdown(f"""
-                **📊 Resumen de Bajas:**
-                
-                - **Cantidad de bajas:** {bajas_data['cantidad_bajas']} empleados
-                - **Coste total de bajas:** €{bajas_data['coste_total_bajas']:,.0f}
-                - **% sobre coste total:** {bajas_data['porcentaje_coste_bajas']:.1f}%
-                """)
-            
-            with col2:
-                if bajas_data['empleados_baja']:
-                    st.markdown("**📋 Lista de Empleados de Baja:**")
-                    
-                    bajas_df = pd.DataFrame(bajas_data['empleados_baja'])
-                    bajas_df['coste'] = bajas_df['coste'].apply(lambda x: f"€{x:,.0f}")
-                    bajas_df['porcentaje_coste'] = bajas_df['porcentaje_coste'].apply(lambda x: f"{x:.1f}%")
-                    bajas_df.columns = ['Nombre', 'Sección', 'Coste', '% del Total']
-                    
-                    st.dataframe(bajas_df, use_container_width=True, hide_index=True)
-        else:
-            st.success(f"🎉 No hay empleados de baja en {selected_month}")
+        render_individual_analysis(controller, data_version, selected_month)
     
     # ================================================================
     # COMPARACIÓN MULTI-MES
     # ================================================================
     else:
-        if not selected_months:
-            st.warning("⚠️ Selecciona al menos un mes para comparar")
-        else:
-            # ================================================================
-            # SECCIÓN 1: TABLA DE KPIs COMPARATIVA
-            # ================================================================
-            st.markdown("""
-            <div class="section-header">
-                <h3 class="section-title">📊 Tabla Comparativa de KPIs</h3>
-            </div>
-            """, unsafe_allow_html=True)
-            
-            kpi_table = controller.create_multi_month_kpi_table(selected_months)
-            
-            if not kpi_table.empty:
-                st.dataframe(
-                    kpi_table, 
-                    use_container_width=True, 
-                    hide_index=True,
-                    height=600
-                )
-                
-                # Botón de descarga
-                csv_data = kpi_table.to_csv(index=False)
-                st.download_button(
-                    label="📄 Descargar Tabla KPIs",
-                    data=csv_data,
-                    file_name=f"KPIs_Comparativa_{datetime.now().strftime('%Y%m%d')}.csv",
-                    mime="text/csv"
-                )
-            else:
-                st.warning("No hay datos disponibles para generar la tabla comparativa")
-            
-            # ================================================================
-            # SECCIÓN 2: GRÁFICOS COMPARATIVOS
-            # ================================================================
-            st.markdown("""
-            <div class="section-header">
-                <h3 class="section-title">📈 Análisis Comparativo entre Meses</h3>
-            </div>
-            """, unsafe_allow_html=True)
-            
-            # 1. Evolución de Costes (líneas de mes, día, hora)
-            st.subheader("📈 Evolución de Costes Totales")
-            fig_evolucion = controller.create_evolucion_costes_chart(selected_months)
-            st.plotly_chart(fig_evolucion, use_container_width=True)
-            
-            col1, col2 = st.columns(2)
-            
-            with col1:
-                # 2. Costes por Sección Comparativo (barras agrupadas)
-                st.subheader("📊 Comparación Costes por Sección")
-                fig_seccion_comp = controller.create_costes_seccion_comparativo_chart(selected_months)
-                st.plotly_chart(fig_seccion_comp, use_container_width=True)
-            
-            with col2:
-                # 3. Tendencia de Bajas
-                st.subheader("🏥 Tendencia de Bajas")
-                fig_bajas_tendencia = controller.create_bajas_tendencia_chart(selected_months)
-                st.plotly_chart(fig_bajas_tendencia, use_container_width=True)
+        render_multi_month_analysis(controller, data_version, selected_months)
 
 else:
     # ================================================================
     # MODO SIN DATOS - CONFIGURACIÓN INICIAL
     # ================================================================
-    st.markdown("""
-    <div class="section-header">
-        <h3 class="section-title">🔧 Configuración Inicial del Sistema</h3>
-    </div>
-    """, unsafe_allow_html=True)
+    display_section_header("🔧 Configuración Inicial del Sistema")
     
     st.markdown("""
     ### 🚀 Bienvenido al Dashboard de RRHH de Garlic & Beyond
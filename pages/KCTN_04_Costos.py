@@ -12,25 +12,20 @@ Versión: 4.0 - Cohesivo con Estética Garlic & Beyond
 import streamlit as st
 import sys
 import os
+import re
 import pandas as pd
-import plotly.express as px
-import plotly.graph_objects as go
-from datetime import datetime
-import time
-import io
-import base64
+from datetime import datetime, date
 
 # ================================================================
 # CONFIGURACIÓN DE PÁGINA
 # ================================================================
-if 'page_config_set' not in st.session_state:
-    st.set_page_config(
-        page_title="Dashboard Costos - Garlic & Beyond",
-        page_icon="💰",
-        layout="wide",
-        initial_sidebar_state="expanded"
-    )
-    st.session_state.page_config_set = True
+# Debe ejecutarse en cada rerun: la configuración no persiste entre ejecuciones
+st.set_page_config(
+    page_title="Dashboard Costos - Garlic & Beyond",
+    page_icon="💰",
+    layout="wide",
+    initial_sidebar_state="expanded"
+)
 
 # ================================================================
 # IMPORTACIONES SEGURAS DE MÓDULOS
@@ -54,24 +49,16 @@ def safe_import():
             from utils.excel_loader import get_dataframe
             excel_available = True
         except ImportError:
-            try:
-                from utils.excel_loader import get_dataframe
-                excel_available = True
-            except ImportError:
-                excel_available = False
-                get_dataframe = None
+            excel_available = False
+            get_dataframe = None
         
         # Intentar importar controlador
         try:
             from utils.controller_KCTN_04_Costos import CostosKCTNController
             controller_available = True
         except ImportError:
-            try:
-                from utils.controller_KCTN_04_Costos import CostosKCTNController
-                controller_available = True
-            except ImportError:
-                controller_available = False
-                CostosKCTNController = None
+            controller_available = False
+            CostosKCTNController = None
         
         return excel_available, controller_available, get_dataframe, CostosKCTNController
         
@@ -84,7 +71,7 @@ excel_available, controller_available, get_dataframe, CostosKCTNController = saf
 # ================================================================
 # CSS PERSONALIZADO PARA GARLIC & BEYOND - TEMA COSTOS
 # ================================================================
-st.markdown("""
+PAGE_CSS = """
 <style>
     /* Importar Google Fonts */
     @import url('https://fonts.googleapis.com/css2?family=Inter:wght@300;400;500;600;700&display=swap');
@@ -383,7 +370,16 @@ st.markdown("""
         .section-header { padding: 1rem 1.5rem; }
     }
 </style>
-""", unsafe_allow_html=True)
+"""
+
+@st.cache_resource
+def get_css():
+    """CSS compactado (sin comentarios ni espacios redundantes); se calcula una vez por proceso."""
+    css = re.sub(r'/\*.*?\*/', '', PAGE_CSS, flags=re.S)
+    return re.sub(r'\s+', ' ', css).strip()
+
+# Se emite en cada ejecución: Streamlit elimina los elementos que no se vuelven a pintar
+st.html(get_css())
 
 # ================================================================
 # INICIALIZACIÓN DEL CONTROLADOR
@@ -398,6 +394,21 @@ if 'costos_controller' not in st.session_state:
 
 controller = st.session_state.costos_controller
 
+@st.cache_data(ttl=3600, show_spinner=False)
+def fetch_costos_data():
+    """Descarga y parsea el Excel de Costos desde SharePoint (memoizado 1 h)."""
+    return get_dataframe('KCTN_04_Costos')
+
+def get_data_signature(data):
+    """Firma de los datos parseados: instante de proceso + número de registros."""
+    metadata = data.get('metadata', {})
+    return f"{metadata.get('processed_at')}|{metadata.get('total_records')}"
+
+@st.cache_resource(max_entries=2)
+def build_costos_controller(data_sig, _data):
+    """Construye el controlador para unos datos (uno por firma, compartido)."""
+    return CostosKCTNController(_data)
+
 # ================================================================
 # FUNCIONES DE UTILIDAD
 # ================================================================
@@ -420,6 +431,46 @@ def display_kpi_card(title, main_value, sub_values, card_type="default"):
     </div>
     """, unsafe_allow_html=True)
 
+# Formatos de columna para las tablas (se envían valores numéricos y el
+# navegador los formatea; así también se ordenan como números)
+PROVEEDORES_COLUMN_CONFIG = {
+    'kg M.P.': st.column_config.NumberColumn(format="%.0f kg"),
+    'Inversión Total': st.column_config.NumberColumn(format="€%.2f"),
+    'Coste/Kg Cat 1': st.column_config.NumberColumn(format="€%.3f"),
+    '% Cat 1': st.column_config.NumberColumn(format="%.1f%%"),
+    'Coste Corredor': st.column_config.NumberColumn(format="€%.2f"),
+    'Coste Porte': st.column_config.NumberColumn(format="€%.2f"),
+}
+
+KPI_TABLE_COLUMN_CONFIG = {
+    'Total kg M.P.': st.column_config.NumberColumn(format="%.0f"),
+    'Total Inversión': st.column_config.NumberColumn(format="€%.0f"),
+    'kg Desgranado': st.column_config.NumberColumn(format="%.0f"),
+    '% Desgrane': st.column_config.NumberColumn(format="%.1f%%"),
+    'kg Cat 1': st.column_config.NumberColumn(format="%.0f"),
+    '% Cat 1 Real': st.column_config.NumberColumn(format="%.1f%%"),
+    '% Cat 1 Esperado': st.column_config.NumberColumn(format="%.1f%%"),
+    'Diferencia %': st.column_config.NumberColumn(format="%.1f%%"),
+    'Coste/kg Corredor': st.column_config.NumberColumn(format="€%.3f"),
+    'Total Corredor': st.column_config.NumberColumn(format="€%.0f"),
+    'Coste/kg Porte': st.column_config.NumberColumn(format="€%.3f"),
+    'Total Porte': st.column_config.NumberColumn(format="€%.0f"),
+    'Coste/kg Cat 1': st.column_config.NumberColumn(format="€%.3f"),
+}
+
+# Plantillas HTML precalculadas; se emiten con st.html (sin pasar por Markdown)
+SECTION_HEADER = '<div class="section-header"><h3 class="section-title">{}</h3></div>'
+STATUS_TPL = (
+    '<div class="status-container"><div style="display: flex; align-items: center;">'
+    '<span class="status-indicator status-{color}"></span>'
+    '<strong>{label}</strong> {message}</div>{details}</div>'
+)
+STATUS_DETAILS_TPL = '<div style="color: var(--text-secondary); font-size: 0.9rem;">{}</div>'
+
+def display_section_header(title):
+    """Muestra una cabecera de sección."""
+    st.html(SECTION_HEADER.format(title))
+
 # ================================================================
 # HEADER PRINCIPAL
 # ================================================================
@@ -446,52 +497,20 @@ st.markdown("""
 # ================================================================
 col1, col2, col3 = st.columns([2, 1, 1])
 
-with col1:
-    if controller:
-        status = controller.get_status()
-        if status['initialized']:
-            st.markdown(f"""
-            <div class="status-container">
-                <div style="display: flex; align-items: center;">
-                    <span class="status-indicator status-green"></span>
-                    <strong>✅ Sistema Activo:</strong> {status['months_with_data']} meses con datos, {status['months_empty']} pendientes
-                </div>
-                <div style="color: var(--text-secondary); font-size: 0.9rem;">
-                    📊 {status['total_records']} registros | 📅 {status['date_range']} | 🕒 {status['last_update']}
-                </div>
-            </div>
-            """, unsafe_allow_html=True)
-        else:
-            st.markdown("""
-            <div class="status-container">
-                <div style="display: flex; align-items: center;">
-                    <span class="status-indicator status-red"></span>
-                    <strong>❌ Sistema Inactivo:</strong> Datos no cargados
-                </div>
-            </div>
-            """, unsafe_allow_html=True)
-    else:
-        st.markdown("""
-        <div class="status-container">
-            <div style="display: flex; align-items: center;">
-                <span class="status-indicator status-red"></span>
-                <strong>⚙️ Sistema Inicializando:</strong> Controlador no disponible
-            </div>
-        </div>
-        """, unsafe_allow_html=True)
-
 with col2:
     if st.button("🔄 Cargar desde SharePoint", help="Cargar datos reales desde SharePoint"):
         with st.spinner("Cargando datos desde SharePoint..."):
             try:
                 if excel_available and get_dataframe:
                     st.info("📥 Descargando datos desde SharePoint...")
-                    excel_data = get_dataframe('KCTN_04_Costos')
+                    excel_data = fetch_costos_data()
                     
                     if excel_data and excel_data.get('status') == 'success':
-                        # Inicializar controlador con datos
+                        # Inicializar controlador con datos (reutilizado si la firma no cambia)
                         if CostosKCTNController:
-                            st.session_state.costos_controller = CostosKCTNController(excel_data)
+                            data_sig = get_data_signature(excel_data)
+                            st.session_state.costos_controller = build_costos_controller(data_sig, excel_data)
+                            st.session_state.costos_data_sig = data_sig
                             controller = st.session_state.costos_controller
                             
                             st.success("✅ Datos cargados correctamente desde SharePoint")
@@ -500,11 +519,11 @@ with col2:
                             # Mostrar resumen de datos cargados
                             metadata = excel_data.get('metadata', {})
                             st.info(f"📊 Total registros: {metadata.get('total_records', 0)}")
-                            
-                            st.rerun()
                         else:
                             st.error("❌ Controlador no disponible")
                     else:
+                        # No conservar en caché una descarga fallida
+                        fetch_costos_data.clear()
                         error_msg = excel_data.get('metadata', {}).get('error', 'Error desconocido') if excel_data else 'Sin respuesta'
                         st.error(f"❌ Error obteniendo datos: {error_msg}")
                 else:
@@ -517,9 +536,354 @@ with col3:
     if st.button("📁 Subir Excel Local", help="Subir archivo Excel desde tu computadora"):
         st.info("🔄 Funcionalidad próximamente disponible")
 
+# El estado se pinta después de procesar la carga para reflejar el
+# controlador recién creado sin un st.rerun() adicional
+with col1:
+    if controller:
+        status = controller.get_status()
+        if status['initialized']:
+            st.html(STATUS_TPL.format(
+                color='green',
+                label='✅ Sistema Activo:',
+                message=f"{status['months_with_data']} meses con datos, {status['months_empty']} pendientes",
+                details=STATUS_DETAILS_TPL.format(
+                    f"📊 {status['total_records']} registros | 📅 {status['date_range']} | 🕒 {status['last_update']}"
+                )
+            ))
+        else:
+            st.html(STATUS_TPL.format(
+                color='red', label='❌ Sistema Inactivo:', message='Datos no cargados', details=''
+            ))
+    else:
+        st.html(STATUS_TPL.format(
+            color='red', label='⚙️ Sistema Inicializando:', message='Controlador no disponible', details=''
+        ))
+
+# ================================================================
+# CONSULTAS AL CONTROLADOR MEMOIZADAS POR FIRMA DE DATOS
+# ================================================================
+# El controlador (_controller) no se hashea; la clave es la firma de los
+# datos cargados (costos_data_sig) más el mes o la tupla de meses.
+@st.cache_data(ttl=300, show_spinner=False)
+def get_cached_monthly_kpis(data_sig, month, _controller):
+    """KPIs de un mes (memoizados)."""
+    return _controller.get_monthly_kpis(month)
+
+@st.cache_data(ttl=300, show_spinner=False)
+def get_cached_performance_matrix(data_sig, month, _controller):
+    """Matriz de rendimiento de un mes (memoizada)."""
+    return _controller.create_performance_matrix_styled(month)
+
+@st.cache_data(ttl=300, show_spinner=False)
+def get_cached_proveedor_data(data_sig, month, _controller):
+    """Análisis de proveedores de un mes (memoizado)."""
+    return _controller.get_analisis_proveedor_data(month)
+
+@st.cache_data(ttl=300, show_spinner=False)
+def get_cached_kpi_table(data_sig, months, _controller):
+    """Tabla comparativa de KPIs para una tupla de meses (memoizada)."""
+    return _controller.create_multi_month_kpi_table(list(months))
+
+@st.cache_data(ttl=300, show_spinner=False)
+def get_cached_kpi_table_csv(data_sig, months, _kpi_table):
+    """CSV de la tabla comparativa (memoizado con la misma clave que la tabla)."""
+    return _kpi_table.to_csv(index=False).encode('utf-8')
+
+@st.cache_data(ttl=300, show_spinner=False)
+def get_cached_figure(data_sig, chart_method, key, _controller, *args):
+    """
+    Figura Plotly de un método create_*_chart del controlador (memoizada).
+    
+    key es el mes (str) o la tupla de meses; la figura se guarda como dict,
+    que st.plotly_chart acepta directamente.
+    """
+    months = list(key) if isinstance(key, tuple) else key
+    return getattr(_controller, chart_method)(months, *args).to_dict()
+
+# ================================================================
+# VISTAS DE ANÁLISIS (FRAGMENTS)
+# ================================================================
+# Cada vista es un fragment: sus widgets (p. ej. la descarga CSV) solo
+# re-ejecutan la vista. Los filtros de la barra lateral quedan en el script
+# principal porque un fragment no puede escribir en st.sidebar y porque
+# determinan qué vista se pinta.
+def render_performance_matrix(controller, data_sig, selected_month):
+    """Matriz de rendimiento del mes con indicadores de color."""
+    display_section_header(f"📊 Matriz de Rendimiento - {selected_month}")
+    
+    # Generar matriz con indicadores de color
+    matrix_df = get_cached_performance_matrix(data_sig, selected_month, controller)
+    
+    if isinstance(matrix_df, pd.DataFrame) and not matrix_df.empty:
+        # Mostrar la matriz con emojis de colores
+        st.dataframe(
+            matrix_df,
+            use_container_width=True,
+            hide_index=True,
+            height=400
+        )
+        
+        # Información de umbrales
+        st.markdown("""
+        **📋 Umbrales de Rendimiento:**
+        - 🟢 **ÓPTIMO**: % DESG ≥85% | % CAT I ≥55% | % CAT II ≥25% | % DAG ≥20% | % MERMA ≤10%
+        - 🔴 **FUERA DE UMBRAL**: Valores que no cumplen los requisitos mínimos
+        """)
+    else:
+        st.info(f"No hay datos disponibles para la matriz de rendimiento en {selected_month}")
+
+def render_providers_table(controller, data_sig, selected_month):
+    """Tabla detallada de proveedores del mes."""
+    display_section_header(f"🏭 Análisis Detallado de Proveedores - {selected_month}")
+    
+    proveedor_data = get_cached_proveedor_data(data_sig, selected_month, controller)
+    
+    if proveedor_data['has_data']:
+        # Crear DataFrame de proveedores
+        proveedores_df = pd.DataFrame(proveedor_data['proveedores'])
+        
+        # Valores numéricos; el formato lo aplica el navegador (PROVEEDORES_COLUMN_CONFIG)
+        proveedores_df['porcentaje_cat1'] = proveedores_df['porcentaje_cat1'] * 100
+        
+        # Renombrar columnas
+        proveedores_df.columns = [
+            'Proveedor', 'kg M.P.', 'Inversión Total', 'Coste/Kg Cat 1', 
+            '% Cat 1', 'Coste Corredor', 'Coste Porte'
+        ]
+        
+        st.dataframe(
+            proveedores_df,
+            use_container_width=True,
+            hide_index=True,
+            column_config=PROVEEDORES_COLUMN_CONFIG
+        )
+    else:
+        st.info(f"No hay datos de proveedores para {selected_month}")
+
+@st.fragment
+def render_individual(controller, data_sig, selected_month):
+    """Vista de análisis individual de un mes."""
+    # Obtener KPIs del mes seleccionado
+    kpis = get_cached_monthly_kpis(data_sig, selected_month, controller)
+    
+    # ================================================================
+    # SECCIÓN 1: KPI CARDS (5 cards según especificaciones)
+    # ================================================================
+    display_section_header(f"📊 KPIs Principales - {selected_month}")
+    
+    # Mostrar mensaje si no hay datos
+    if not kpis['has_data']:
+        st.info(f"📅 {selected_month} - Datos pendientes de cargar")
+    
+    # Primera fila: Desgrane y Categoría 1
+    col1, col2 = st.columns(2)
+    
+    with col1:
+        # KPI Card 1: Desgrane
+        display_kpi_card(
+            "🌾 Desgrane",
+            f"{kpis['total_kg_desgranado']:,.0f} kg",
+            [
+                ("% Desgrane", f"{kpis['promedio_porcentaje_desg']*100:.1f}%", ""),
+            ],
+            "desgrane"
+        )
+    
+    with col2:
+        # KPI Card 2: Categoría 1
+        diferencia = kpis['promedio_diferencia']
+        diferencia_style = "metric-positive" if diferencia >= 0 else "metric-negative"
+        diferencia_icon = "📈" if diferencia >= 0 else "📉"
+        
+        display_kpi_card(
+            "🥇 Categoría 1",
+            f"{kpis['total_kg_cat1']:,.0f} kg",
+            [
+                ("% Real", f"{kpis['promedio_porcentaje_cat1']*100:.1f}%", ""),
+                ("% Esperado", f"{kpis['promedio_porcentaje_estimado']*100:.1f}%", ""),
+                ("Diferencia", f"{diferencia_icon} {diferencia*100:.1f}%", diferencia_style)
+            ],
+            "categoria1"
+        )
+    
+    # Segunda fila: Corredor y Porte
+    col3, col4 = st.columns(2)
+    
+    with col3:
+        # KPI Card 3: Coste de corredor
+        display_kpi_card(
+            "🤝 Coste de Corredor",
+            f"€{kpis['promedio_coste_kg_corredor']:.3f}/kg",
+            [
+                ("Total", f"€{kpis['total_coste_corredor']:,.2f}", ""),
+            ],
+            "corredor"
+        )
+    
+    with col4:
+        # KPI Card 4: Porte
+        display_kpi_card(
+            "🚛 Porte",
+            f"€{kpis['promedio_coste_kg_porte']:.3f}/kg",
+            [
+                ("Total", f"€{kpis['total_porte']:,.2f}", ""),
+            ],
+            "porte"
+        )
+    
+    # Tercera fila: Coste promedio (centrado)
+    col_center = st.columns([1, 2, 1])
+    with col_center[1]:
+        # KPI Card 5: Promedio de Coste por Kg diente Cat 1
+        display_kpi_card(
+            "💰 Promedio Coste/Kg Diente Cat 1",
+            f"€{kpis['promedio_coste_kg_diente_cat1']:.3f}",
+            [
+                ("por kilogramo", "", ""),
+            ],
+            "coste-promedio"
+        )
+    
+    # ================================================================
+    # SECCIÓN 2: GRÁFICOS INDIVIDUALES
+    # ================================================================
+    display_section_header(f"📈 Análisis Gráfico - {selected_month}")
+    
+    col1, col2 = st.columns(2)
+    
+    with col1:
+        # 1. Tendencia de Coste por Kg diente Cat 1
+        st.subheader("📈 Evolución Coste/Kg Diente Cat 1")
+        fig_coste_trend = get_cached_figure(data_sig, 'create_coste_cat1_trend_chart', selected_month, controller)
+        st.plotly_chart(fig_coste_trend, use_container_width=True)
+    
+    with col2:
+        # 2. Comparación por Proveedor
+        st.subheader("🏭 Inversión por Proveedor")
+        fig_proveedor_comp = get_cached_figure(data_sig, 'create_proveedor_comparison_chart', selected_month, controller)
+        st.plotly_chart(fig_proveedor_comp, use_container_width=True)
+    
+    # ================================================================
+    # SECCIÓN 3: MATRIZ DE RENDIMIENTO
+    # ================================================================
+    render_performance_matrix(controller, data_sig, selected_month)
+    
+    # ================================================================
+    # SECCIÓN 4: ANÁLISIS DETALLADO DE PROVEEDORES
+    # ================================================================
+    render_providers_table(controller, data_sig, selected_month)
+
+@st.fragment
+def render_multi_month(controller, data_sig, selected_months):
+    """Vista de comparación entre varios meses."""
+    if not selected_months:
+        st.warning("⚠️ Selecciona al menos un mes para comparar")
+    else:
+        # ================================================================
+        # SECCIÓN 1: TABLA DE KPIs COMPARATIVA
+        # ================================================================
+        display_section_header("📊 Tabla Comparativa de KPIs")
+        
+        months_key = tuple(selected_months)
+        kpi_table = get_cached_kpi_table(data_sig, months_key, controller)
+        
+        if not kpi_table.empty:
+            # Mostrar tabla con estilo
+            st.dataframe(
+                kpi_table, 
+                use_container_width=True, 
+                hide_index=True,
+                height=400,
+                column_config=KPI_TABLE_COLUMN_CONFIG
+            )
+            
+            # Botón de descarga
+            csv_data = get_cached_kpi_table_csv(data_sig, months_key, kpi_table)
+            st.download_button(
+                label="📄 Descargar Tabla KPIs",
+                data=csv_data,
+                file_name=f"KPIs_Comparativa_Costos_{date.today():%Y%m%d}.csv",
+                mime="text/csv"
+            )
+        else:
+            st.warning("No hay datos disponibles para generar la tabla comparativa")
+        
+        # ================================================================
+        # SECCIÓN 2: GRÁFICOS COMPARATIVOS
+        # ================================================================
+        display_section_header("📈 Análisis Comparativo entre Meses")
+        
+        # Dashboard de evolución integral
+        st.subheader("📊 Dashboard de Evolución Integral")
+        try:
+            fig_comprehensive = get_cached_figure(data_sig, 'create_comprehensive_evolution_chart', months_key, controller)
+            st.plotly_chart(fig_comprehensive, use_container_width=True)
+        except Exception as e:
+            st.error(f"Error creando dashboard integral: {e}")
+            # Fallback a gráficos individuales
+            col1, col2 = st.columns(2)
+            
+            with col1:
+                st.subheader("📈 Evolución Coste/Kg Diente Cat 1")
+                fig_coste_evolution = get_cached_figure(data_sig, 'create_multi_month_comparison_chart', months_key, controller, 'coste_cat1')
+                st.plotly_chart(fig_coste_evolution, use_container_width=True)
+            
+            with col2:
+                st.subheader("🤝 Evolución Coste Total Corredor")
+                fig_corredor_evolution = get_cached_figure(data_sig, 'create_multi_month_comparison_chart', months_key, controller, 'total_corredor')
+                st.plotly_chart(fig_corredor_evolution, use_container_width=True)
+            
+            st.subheader("🚛 Evolución Coste Total Porte")
+            fig_porte_evolution = get_cached_figure(data_sig, 'create_multi_month_comparison_chart', months_key, controller, 'total_porte')
+            st.plotly_chart(fig_porte_evolution, use_container_width=True)
+        
+        # ================================================================
+        # SECCIÓN 3: RESUMEN ESTADÍSTICO MULTI-MES
+        # ================================================================
+        display_section_header("📊 Resumen Estadístico")
+        
+        # Calcular estadísticas agregadas
+        total_months_with_data = len([m for m in selected_months if m in controller.monthly_data and controller.monthly_data[m]['has_data']])
+        
+        if total_months_with_data > 0:
+            # Obtener todos los KPIs de los meses seleccionados
+            all_kpis = [get_cached_monthly_kpis(data_sig, m, controller) for m in selected_months if m in controller.monthly_data and controller.monthly_data[m]['has_data']]
+            
+            if all_kpis:
+                # Calcular totales y promedios en una única agregación
+                agg = pd.DataFrame(all_kpis).agg({
+                    'total_records': 'sum',
+                    'total_kg_mp': 'sum',
+                    'total_inversion': 'sum',
+                    'promedio_coste_kg_diente_cat1': 'mean'
+                })
+                total_records = int(agg['total_records'])
+                total_kg_mp = agg['total_kg_mp']
+                total_inversion = agg['total_inversion']
+                avg_coste_cat1 = agg['promedio_coste_kg_diente_cat1']
+                
+                col1, col2, col3, col4 = st.columns(4)
+                
+                with col1:
+                    st.metric("📋 Total Registros", f"{total_records:,}")
+                
+                with col2:
+                    st.metric("⚖️ Total kg M.P.", f"{total_kg_mp:,.0f} kg")
+                
+                with col3:
+                    st.metric("💶 Total Inversión", f"€{total_inversion:,.0f}")
+                
+                with col4:
+                    st.metric("💰 Coste Promedio Cat 1", f"€{avg_coste_cat1:.3f}/kg")
+        else:
+            st.info("No hay datos para mostrar resumen estadístico")
+
+
 # ================================================================
 # CONTENIDO PRINCIPAL - SOLO SI HAY CONTROLADOR INICIALIZADO
 # ================================================================
+data_sig = st.session_state.get('costos_data_sig')
+
 if controller and controller.is_initialized:
     
     # ================================================================
@@ -574,301 +938,19 @@ if controller and controller.is_initialized:
     # ANÁLISIS INDIVIDUAL
     # ================================================================
     if analysis_mode == "📊 Análisis Individual":
-        
-        # Obtener KPIs del mes seleccionado
-        kpis = controller.get_monthly_kpis(selected_month)
-        
-        # ================================================================
-        # SECCIÓN 1: KPI CARDS (5 cards según especificaciones)
-        # ================================================================
-        st.markdown(f"""
-        <div class="section-header">
-            <h3 class="section-title">📊 KPIs Principales - {selected_month}</h3>
-        </div>
-        """, unsafe_allow_html=True)
-        
-        # Mostrar mensaje si no hay datos
-        if not kpis['has_data']:
-            st.info(f"📅 {selected_month} - Datos pendientes de cargar")
-        
-        # Primera fila: Desgrane y Categoría 1
-        col1, col2 = st.columns(2)
-        
-        with col1:
-            # KPI Card 1: Desgrane
-            display_kpi_card(
-                "🌾 Desgrane",
-                f"{kpis['total_kg_desgranado']:,.0f} kg",
-                [
-                    ("% Desgrane", f"{kpis['promedio_porcentaje_desg']*100:.1f}%", ""),
-                ],
-                "desgrane"
-            )
-        
-        with col2:
-            # KPI Card 2: Categoría 1
-            diferencia = kpis['promedio_diferencia']
-            diferencia_style = "metric-positive" if diferencia >= 0 else "metric-negative"
-            diferencia_icon = "📈" if diferencia >= 0 else "📉"
-            
-            display_kpi_card(
-                "🥇 Categoría 1",
-                f"{kpis['total_kg_cat1']:,.0f} kg",
-                [
-                    ("% Real", f"{kpis['promedio_porcentaje_cat1']*100:.1f}%", ""),
-                    ("% Esperado", f"{kpis['promedio_porcentaje_estimado']*100:.1f}%", ""),
-                    ("Diferencia", f"{diferencia_icon} {diferencia*100:.1f}%", diferencia_style)
-                ],
-                "categoria1"
-            )
-        
-        # Segunda fila: Corredor y Porte
-        col3, col4 = st.columns(2)
-        
-        with col3:
-            # KPI Card 3: Coste de corredor
-            display_kpi_card(
-                "🤝 Coste de Corredor",
-                f"€{kpis['promedio_coste_kg_corredor']:.3f}/kg",
-                [
-                    ("Total", f"€{kpis['total_coste_corredor']:,.2f}", ""),
-                ],
-                "corredor"
-            )
-        
-        with col4:
-            # KPI Card 4: Porte
-            display_kpi_card(
-                "🚛 Porte",
-                f"€{kpis['promedio_coste_kg_porte']:.3f}/kg",
-                [
-                    ("Total", f"€{kpis['total_porte']:,.2f}", ""),
-                ],
-                "porte"
-            )
-        
-        # Tercera fila: Coste promedio (centrado)
-        col_center = st.columns([1, 2, 1])
-        with col_center[1]:
-            # KPI Card 5: Promedio de Coste por Kg diente Cat 1
-            display_kpi_card(
-                "💰 Promedio Coste/Kg Diente Cat 1",
-                f"€{kpis['promedio_coste_kg_diente_cat1']:.3f}",
-                [
-                    ("por kilogramo", "", ""),
-                ],
-                "coste-promedio"
-            )
-        
-        # ================================================================
-        # SECCIÓN 2: GRÁFICOS INDIVIDUALES
-        # ================================================================
-        st.markdown(f"""
-        <div class="section-header">
-            <h3 class="section-title">📈 Análisis Gráfico - {selected_month}</h3>
-        </div>
-        """, unsafe_allow_html=True)
-        
-        col1, col2 = st.columns(2)
-        
-        with col1:
-            # 1. Tendencia de Coste por Kg diente Cat 1
-            st.subheader("📈 Evolución Coste/Kg Diente Cat 1")
-            fig_coste_trend = controller.create_coste_cat1_trend_chart(selected_month)
-            st.plotly_chart(fig_coste_trend, use_container_width=True)
-        
-        with col2:
-            # 2. Comparación por Proveedor
-            st.subheader("🏭 Inversión por Proveedor")
-            fig_proveedor_comp = controller.create_proveedor_comparison_chart(selected_month)
-            st.plotly_chart(fig_proveedor_comp, use_container_width=True)
-        
-        # ================================================================
-        # SECCIÓN 3: MATRIZ DE RENDIMIENTO
-        # ================================================================
-        st.markdown(f"""
-        <div class="section-header">
-            <h3 class="section-title">📊 Matriz de Rendimiento - {selected_month}</h3>
-        </div>
-        """, unsafe_allow_html=True)
-        
-        # Generar matriz con indicadores de color
-        matrix_df = controller.create_performance_matrix_styled(selected_month)
-        
-        if isinstance(matrix_df, pd.DataFrame) and not matrix_df.empty:
-            # Mostrar la matriz con emojis de colores
-            st.dataframe(
-                matrix_df,
-                use_container_width=True,
-                hide_index=True,
-                height=400
-            )
-            
-            # Información de umbrales
-            st.markdown("""
-            **📋 Umbrales de Rendimiento:**
-            - 🟢 **ÓPTIMO**: % DESG ≥85% | % CAT I ≥55% | % CAT II ≥25% | % DAG ≥20% | % MERMA ≤10%
-            - 🔴 **FUERA DE UMBRAL**: Valores que no cumplen los requisitos mínimos
-            """)
-        else:
-            st.info(f"No hay datos disponibles para la matriz de rendimiento en {selected_month}")
-        
-        # ================================================================
-        # SECCIÓN 4: ANÁLISIS DETALLADO DE PROVEEDORES
-        # ================================================================
-        st.markdown(f"""
-        <div class="section-header">
-            <h3 class="section-title">🏭 Análisis Detallado de Proveedores - {selected_month}</h3>
-        </div>
-        """, unsafe_allow_html=True)
-        
-        proveedor_data = controller.get_analisis_proveedor_data(selected_month)
-        
-        if proveedor_data['has_data']:
-            # Crear DataFrame de proveedores
-            proveedores_df = pd.DataFrame(proveedor_data['proveedores'])
-            
-            # Formatear columnas
-            proveedores_df['kg_mp'] = proveedores_df['kg_mp'].apply(lambda x: f"{x:,.0f} kg")
-            proveedores_df['total_inversion'] = proveedores_df['total_inversion'].apply(lambda x: f"€{x:,.2f}")
-            proveedores_df['coste_kg_cat1'] = proveedores_df['coste_kg_cat1'].apply(lambda x: f"€{x:.3f}")
-            proveedores_df['porcentaje_cat1'] = proveedores_df['porcentaje_cat1'].apply(lambda x: f"{x*100:.1f}%")
-            proveedores_df['coste_corredor'] = proveedores_df['coste_corredor'].apply(lambda x: f"€{x:.2f}")
-            proveedores_df['coste_porte'] = proveedores_df['coste_porte'].apply(lambda x: f"€{x:.2f}")
-            
-            # Renombrar columnas
-            proveedores_df.columns = [
-                'Proveedor', 'kg M.P.', 'Inversión Total', 'Coste/Kg Cat 1', 
-                '% Cat 1', 'Coste Corredor', 'Coste Porte'
-            ]
-            
-            st.dataframe(
-                proveedores_df,
-                use_container_width=True,
-                hide_index=True
-            )
-        else:
-            st.info(f"No hay datos de proveedores para {selected_month}")
+        render_individual(controller, data_sig, selected_month)
     
     # ================================================================
     # COMPARACIÓN MULTI-MES
     # ================================================================
     else:
-        if not selected_months:
-            st.warning("⚠️ Selecciona al menos un mes para comparar")
-        else:
-            # ================================================================
-            # SECCIÓN 1: TABLA DE KPIs COMPARATIVA
-            # ================================================================
-            st.markdown("""
-            <div class="section-header">
-                <h3 class="section-title">📊 Tabla Comparativa de KPIs</h3>
-            </div>
-            """, unsafe_allow_html=True)
-            
-            kpi_table = controller.create_multi_month_kpi_table(selected_months)
-            
-            if not kpi_table.empty:
-                # Mostrar tabla con estilo
-                st.dataframe(
-                    kpi_table, 
-                    use_container_width=True, 
-                    hide_index=True,
-                    height=400
-                )
-                
-                # Botón de descarga
-                csv_data = kpi_table.to_csv(index=False)
-                st.download_button(
-                    label="📄 Descargar Tabla KPIs",
-                    data=csv_data,
-                    file_name=f"KPIs_Comparativa_Costos_{datetime.now().strftime('%Y%m%d')}.csv",
-                    mime="text/csv"
-                )
-            else:
-                st.warning("No hay datos disponibles para generar la tabla comparativa")
-            
-            # ================================================================
-            # SECCIÓN 2: GRÁFICOS COMPARATIVOS
-            # ================================================================
-            st.markdown("""
-            <div class="section-header">
-                <h3 class="section-title">📈 Análisis Comparativo entre Meses</h3>
-            </div>
-            """, unsafe_allow_html=True)
-            
-            # Dashboard de evolución integral
-            st.subheader("📊 Dashboard de Evolución Integral")
-            try:
-                fig_comprehensive = controller.create_comprehensive_evolution_chart(selected_months)
-                st.plotly_chart(fig_comprehensive, use_container_width=True)
-            except Exception as e:
-                st.error(f"Error creando dashboard integral: {e}")
-                # Fallback a gráficos individuales
-                col1, col2 = st.columns(2)
-                
-                with col1:
-                    st.subheader("📈 Evolución Coste/Kg Diente Cat 1")
-                    fig_coste_evolution = controller.create_multi_month_comparison_chart(selected_months, 'coste_cat1')
-                    st.plotly_chart(fig_coste_evolution, use_container_width=True)
-                
-                with col2:
-                    st.subheader("🤝 Evolución Coste Total Corredor")
-                    fig_corredor_evolution = controller.create_multi_month_comparison_chart(selected_months, 'total_corredor')
-                    st.plotly_chart(fig_corredor_evolution, use_container_width=True)
-                
-                st.subheader("🚛 Evolución Coste Total Porte")
-                fig_porte_evolution = controller.create_multi_month_comparison_chart(selected_months, 'total_porte')
-                st.plotly_chart(fig_porte_evolution, use_container_width=True)
-            
-            # ================================================================
-            # SECCIÓN 3: RESUMEN ESTADÍSTICO MULTI-MES
-            # ================================================================
-            st.markdown("""
-            <div class="section-header">
-                <h3 class="section-title">📊 Resumen Estadístico</h3>
-            </div>
-            """, unsafe_allow_html=True)
-            
-            # Calcular estadísticas agregadas
-            total_months_with_data = len([m for m in selected_months if m in controller.monthly_data and controller.monthly_data[m]['has_data']])
-            
-            if total_months_with_data > 0:
-                # Obtener todos los KPIs de los meses seleccionados
-                all_kpis = [controller.get_monthly_kpis(m) for m in selected_months if m in controller.monthly_data and controller.monthly_data[m]['has_data']]
-                
-                if all_kpis:
-                    # Calcular totales y promedios
-                    total_records = sum(kpi['total_records'] for kpi in all_kpis)
-                    total_kg_mp = sum(kpi['total_kg_mp'] for kpi in all_kpis)
-                    total_inversion = sum(kpi['total_inversion'] for kpi in all_kpis)
-                    avg_coste_cat1 = sum(kpi['promedio_coste_kg_diente_cat1'] for kpi in all_kpis) / len(all_kpis)
-                    
-                    col1, col2, col3, col4 = st.columns(4)
-                    
-                    with col1:
-                        st.metric("📋 Total Registros", f"{total_records:,}")
-                    
-                    with col2:
-                        st.metric("⚖️ Total kg M.P.", f"{total_kg_mp:,.0f} kg")
-                    
-                    with col3:
-                        st.metric("💶 Total Inversión", f"€{total_inversion:,.0f}")
-                    
-                    with col4:
-                        st.metric("💰 Coste Promedio Cat 1", f"€{avg_coste_cat1:.3f}/kg")
-            else:
-                st.info("No hay datos para mostrar resumen estadístico")
+        render_multi_month(controller, data_sig, selected_months)
 
 else:
     # ================================================================
     # MODO SIN DATOS - CONFIGURACIÓN INICIAL
     # ================================================================
-    st.markdown("""
-    <div class="section-header">
-        <h3 class="section-title">🔧 Configuración Inicial del Sistema</h3>
-    </div>
-    """, unsafe_allow_html=True)
+    display_section_header("🔧 Configuración Inicial del Sistema")
     
     st.markdown("""
     ### 🚀 Bienvenido al Dashboard de Costos KCTN de Garlic & Beyond
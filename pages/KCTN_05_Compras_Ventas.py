@@ -18,14 +18,13 @@ Versión: 2.0 - CORREGIDO
 
 import streamlit as st
 import sys
+import json
 import os
+import numpy as np
 import pandas as pd
-import plotly.express as px
-import plotly.graph_objects as go
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-import time
-import io
-import base64
+from string import Template
 
 # ================================================================
 # CONFIGURACIÓN DE PÁGINA
@@ -42,8 +41,9 @@ if 'page_config_set' not in st.session_state:
 # ================================================================
 # IMPORTACIONES SEGURAS DE MÓDULOS
 # ================================================================
+@st.cache_resource
 def safe_import():
-    """Importa módulos de manera segura con múltiples rutas."""
+    """Importa módulos de manera segura (una sola vez por proceso)."""
     try:
         # Agregar rutas posibles
         current_file = os.path.abspath(__file__)
@@ -61,36 +61,24 @@ def safe_import():
             from utils.excel_loader import get_dataframe
             excel_available = True
         except ImportError:
-            try:
-                from utils.excel_loader import get_dataframe
-                excel_available = True
-            except ImportError:
-                excel_available = False
-                get_dataframe = None
+            excel_available = False
+            get_dataframe = None
         
         # Intentar importar controlador
         try:
             from utils.controller_KCTN_05_Compras_Ventas import GarlicComprasVentasController
             controller_available = True
         except ImportError:
-            try:
-                from utils.controller_KCTN_05_Compras_Ventas import GarlicComprasVentasController
-                controller_available = True
-            except ImportError:
-                controller_available = False
-                GarlicComprasVentasController = None
+            controller_available = False
+            GarlicComprasVentasController = None
         
         # Intentar importar parser
         try:
             from utils.parser_KCTN_05_Compras_Ventas import parse_excel
             parser_available = True
         except ImportError:
-            try:
-                from utils.parser_KCTN_05_Compras_Ventas import parse_excel
-                parser_available = True
-            except ImportError:
-                parser_available = False
-                parse_excel = None
+            parser_available = False
+            parse_excel = None
         
         return excel_available, controller_available, parser_available, get_dataframe, GarlicComprasVentasController, parse_excel
         
@@ -103,302 +91,19 @@ excel_available, controller_available, parser_available, get_dataframe, GarlicCo
 # ================================================================
 # CSS PERSONALIZADO PARA GARLIC & BEYOND (MISMO DEL ORIGINAL)
 # ================================================================
-st.markdown("""
-<style>
-    @import url('https://fonts.googleapis.com/css2?family=Inter:wght@300;400;500;600;700&display=swap');
-    
-    :root {
-        --primary-color: #2E7D32;
-        --secondary-color: #4CAF50;
-        --success-color: #66BB6A;
-        --warning-color: #FF9800;
-        --error-color: #F44336;
-        --info-color: #2196F3;
-        --text-primary: #1B5E20;
-        --text-secondary: #388E3C;
-        --background-white: #ffffff;
-        --background-light: #F1F8E9;
-        --border-light: #C8E6C9;
-        --shadow-sm: 0 1px 2px 0 rgba(46, 125, 50, 0.05);
-        --shadow-md: 0 4px 6px -1px rgba(46, 125, 50, 0.1);
-        --shadow-lg: 0 10px 15px -3px rgba(46, 125, 50, 0.1);
-        --shadow-xl: 0 20px 25px -5px rgba(46, 125, 50, 0.1);
-    }
-    
-    html, body, [class*="css"] {
-        font-family: 'Inter', -apple-system, BlinkMacSystemFont, 'Segoe UI', sans-serif;
-    }
-    
-    .main .block-container {
-        background: var(--background-white);
-        padding-top: 1rem;
-        max-width: 1400px;
-    }
-    
-    .main-header {
-        background: linear-gradient(135deg, var(--primary-color) 0%, var(--secondary-color) 100%);
-        padding: 2.5rem 2rem;
-        border-radius: 20px;
-        margin-bottom: 2rem;
-        color: white;
-        text-align: center;
-        box-shadow: var(--shadow-xl);
-        position: relative;
-        overflow: hidden;
-    }
-    
-    .main-header::before {
-        content: '🧄';
-        position: absolute;
-        top: 1rem;
-        right: 2rem;
-        font-size: 3rem;
-        opacity: 0.2;
-    }
-    
-    .main-header h1 {
-        font-size: 2.5rem;
-        font-weight: 700;
-        margin: 0;
-        text-shadow: 0 2px 4px rgba(0,0,0,0.1);
-    }
-    
-    .main-header h2 {
-        font-size: 1.8rem;
-        font-weight: 500;
-        margin: 0.5rem 0;
-        opacity: 0.95;
-    }
-    
-    .main-header p {
-        font-size: 1.1rem;
-        font-weight: 400;
-        margin-top: 1rem;
-        opacity: 0.9;
-    }
-    
-    .kpi-card {
-        background: var(--background-white);
-        padding: 2rem 1.5rem;
-        border-radius: 16px;
-        border: 1px solid var(--border-light);
-        box-shadow: var(--shadow-lg);
-        margin-bottom: 1.5rem;
-        transition: all 0.3s ease;
-        position: relative;
-        overflow: hidden;
-    }
-    
-    .kpi-card::before {
-        content: '';
-        position: absolute;
-        top: 0;
-        left: 0;
-        right: 0;
-        height: 4px;
-        background: linear-gradient(90deg, var(--primary-color), var(--secondary-color));
-    }
-    
-    .kpi-card:hover {
-        transform: translateY(-4px);
-        box-shadow: var(--shadow-xl);
-    }
-    
-    .kpi-card-compras::before {
-        background: linear-gradient(90deg, #1976D2, #42A5F5);
-    }
-    
-    .kpi-card-proveedores::before {
-        background: linear-gradient(90deg, var(--primary-color), var(--secondary-color));
-    }
-    
-    .kpi-card-ventas::before {
-        background: linear-gradient(90deg, #F44336, #FF7043);
-    }
-    
-    .kpi-card-clientes::before {
-        background: linear-gradient(90deg, #673AB7, #9C27B0);
-    }
-    
-    .metric-container {
-        display: flex;
-        flex-direction: column;
-        align-items: center;
-        text-align: center;
-    }
-    
-    .metric-title {
-        font-size: 1.1rem;
-        font-weight: 600;
-        color: var(--text-primary);
-        margin-bottom: 1rem;
-        text-transform: uppercase;
-        letter-spacing: 0.5px;
-    }
-    
-    .metric-value-large {
-        font-size: 2.2rem;
-        font-weight: 700;
-        color: var(--primary-color);
-        margin-bottom: 0.5rem;
-        line-height: 1.2;
-    }
-    
-    .metric-value-small {
-        font-size: 1.1rem;
-        font-weight: 600;
-        color: var(--text-secondary);
-        margin: 0.25rem 0;
-        line-height: 1.3;
-    }
-    
-    .section-header {
-        background: linear-gradient(135deg, var(--background-light) 0%, #E8F5E8 100%);
-        padding: 1.5rem 2rem;
-        border-radius: 12px;
-        border-left: 5px solid var(--primary-color);
-        margin: 2.5rem 0 1.5rem 0;
-        box-shadow: var(--shadow-sm);
-    }
-    
-    .section-title {
-        font-size: 1.4rem;
-        font-weight: 600;
-        color: var(--text-primary);
-        margin: 0;
-        display: flex;
-        align-items: center;
-        gap: 0.5rem;
-    }
-    
-    .status-container {
-        display: flex;
-        align-items: center;
-        justify-content: space-between;
-        gap: 1rem;
-        padding: 1.5rem;
-        background: var(--background-white);
-        border-radius: 12px;
-        border: 1px solid var(--border-light);
-        box-shadow: var(--shadow-md);
-        margin-bottom: 1rem;
-    }
-    
-    .status-indicator {
-        width: 12px;
-        height: 12px;
-        border-radius: 50%;
-        margin-right: 12px;
-        box-shadow: 0 0 0 2px rgba(255,255,255,0.8);
-    }
-    
-    .status-green { background-color: var(--success-color); }
-    .status-orange { background-color: var(--warning-color); }
-    .status-red { background-color: var(--error-color); }
-    
-    .alert {
-        padding: 1.5rem 2rem;
-        border-radius: 12px;
-        margin: 1.5rem 0;
-        border-left: 5px solid;
-        box-shadow: var(--shadow-sm);
-    }
-    
-    .alert-success {
-        background: linear-gradient(135deg, #E8F5E8 0%, #C8E6C9 100%);
-        border-color: var(--success-color);
-        color: #2E7D32;
-    }
-    
-    .alert-warning {
-        background: linear-gradient(135deg, #FFF3E0 0%, #FFE0B2 100%);
-        border-color: var(--warning-color);
-        color: #E65100;
-    }
-    
-    .alert-info {
-        background: linear-gradient(135deg, #E3F2FD 0%, #BBDEFB 100%);
-        border-color: var(--info-color);
-        color: #0D47A1;
-    }
-    
-    .stTabs [data-baseweb="tab-list"] {
-        gap: 8px;
-        background: var(--background-light);
-        padding: 8px;
-        border-radius: 12px;
-    }
-    
-    .stTabs [data-baseweb="tab"] {
-        height: 50px;
-        padding: 0 24px;
-        background: var(--background-white);
-        border-radius: 8px;
-        border: 1px solid var(--border-light);
-        color: var(--text-primary);
-        font-weight: 600;
-    }
-    
-    .stTabs [aria-selected="true"] {
-        background: var(--primary-color);
-        color: white;
-        box-shadow: var(--shadow-md);
-    }
-    
-    .stButton > button {
-        background: linear-gradient(135deg, var(--primary-color) 0%, var(--secondary-color) 100%);
-        color: white;
-        border: none;
-        border-radius: 10px;
-        padding: 0.75rem 1.5rem;
-        font-weight: 600;
-        font-size: 0.9rem;
-        transition: all 0.3s ease;
-        box-shadow: var(--shadow-md);
-    }
-    
-    .stButton > button:hover {
-        transform: translateY(-2px);
-        box-shadow: var(--shadow-lg);
-    }
-    
-    .dataframe {
-        border-radius: 12px;
-        overflow: hidden;
-        box-shadow: var(--shadow-lg);
-        border: 1px solid var(--border-light);
-    }
-    
-    .dataframe thead th {
-        background: linear-gradient(135deg, var(--background-light) 0%, #E8F5E8 100%);
-        color: var(--text-primary);
-        font-weight: 600;
-        padding: 1rem;
-        border-bottom: 2px solid var(--border-light);
-    }
-    
-    .dataframe tbody td {
-        padding: 0.75rem 1rem;
-        border-bottom: 1px solid var(--border-light);
-    }
-    
-    .dataframe tbody tr:hover {
-        background-color: var(--background-light);
-    }
-    
-    #MainMenu {visibility: hidden;}
-    footer {visibility: hidden;}
-    header {visibility: hidden;}
-    .stDeployButton {visibility: hidden;}
-    
-    @media (max-width: 768px) {
-        .main-header h1 { font-size: 2rem; }
-        .main-header h2 { font-size: 1.5rem; }
-        .kpi-card { padding: 1.5rem 1rem; }
-        .section-header { padding: 1rem 1.5rem; }
-    }
-</style>
-""", unsafe_allow_html=True)
+# Hoja de estilos de la página (ya compactada) en static/
+PAGE_CSS_PATH = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'static', 'kctn_05_compras_ventas.css'
+)
+
+@st.cache_resource
+def get_css():
+    """Lee la hoja de estilos una vez por proceso y la devuelve como bloque <style>."""
+    with open(PAGE_CSS_PATH, encoding='utf-8') as css_file:
+        return f"<style>{css_file.read()}</style>"
+
+# Se emite en cada ejecución: Streamlit elimina los elementos que no se vuelven a pintar
+st.html(get_css())
 
 # ================================================================
 # INICIALIZACIÓN DEL CONTROLADOR
@@ -410,119 +115,254 @@ def init_controller():
         return GarlicComprasVentasController()
     return None
 
-if 'garlic_compras_ventas_controller' not in st.session_state:
-    st.session_state.garlic_compras_ventas_controller = init_controller()
+# La sesión solo guarda el controlador con datos cargados; mientras no lo hay se
+# usa directamente el singleton sin datos de init_controller()
+controller = st.session_state.get('garlic_compras_ventas_controller') or init_controller()
+
+@st.cache_data(ttl=3600, show_spinner=False)
+def fetch_compras_ventas_data():
+    """Descarga el Excel de Compras y Ventas desde SharePoint (memoizado 1 h)."""
+    return get_dataframe('KCTN_05_Compras_Ventas')
+
+@st.cache_resource(max_entries=2)
+def build_compras_ventas_controller(data_sig, _parsed_data):
+    """
+    Construye e inicializa un controlador para unos datos parseados
+    (uno por firma). Devuelve None si la inicialización falla.
+    """
+    new_controller = GarlicComprasVentasController()
+    if new_controller.initialize_with_data(_parsed_data):
+        return new_controller
+    return None
+
+# Animaciones de celebración desactivadas salvo SHOW_CELEBRATIONS=1
+SHOW_CELEBRATIONS = os.environ.get("SHOW_CELEBRATIONS", "0") == "1"
+
+@st.cache_resource
+def get_load_executor():
+    """Pool de hilos compartido para las descargas desde SharePoint."""
+    return ThreadPoolExecutor(max_workers=2, thread_name_prefix="kctn05-load")
+
+@st.fragment(run_every="500ms")
+def render_load_progress():
+    """
+    Sondea la descarga en segundo plano sin bloquear el resto de la página.
+    Al terminar, pasa el future a 'load_result' y relanza la app para procesarlo.
+    """
+    load_future = st.session_state.get('load_future')
+    if load_future is None:
+        return
+    if load_future.done():
+        st.session_state.load_result = st.session_state.pop('load_future')
+        st.rerun(scope="app")
+    st.info("📥 Descargando datos desde SharePoint en segundo plano...")
+
+def load_compras_ventas_controller(parsed_data):
+    """Obtiene el controlador de caché para los datos y lo guarda en la sesión."""
+    data_sig = hash(str(parsed_data.get('metadata')))
+    new_controller = build_compras_ventas_controller(data_sig, parsed_data)
+    if new_controller is None:
+        build_compras_ventas_controller.clear()
+        return None
+    st.session_state.garlic_compras_ventas_controller = new_controller
+    return new_controller
+
+@st.cache_data(ttl=300, show_spinner=False)
+def get_cached_status(token, _controller):
+    """Estado del controlador, recalculado solo cuando cambian los datos (token)."""
+    return _controller.get_status()
 
-controller = st.session_state.garlic_compras_ventas_controller
+@st.cache_data(ttl=300, show_spinner=False)
+def get_cached_available_months(token, _controller):
+    """Períodos (mes-año) disponibles, una vez por carga de datos."""
+    return _controller.get_available_months()
+
+@st.cache_data(ttl=300, show_spinner=False)
+def get_cached_months_with_data(token, _controller):
+    """Períodos (mes-año) con datos válidos, una vez por carga de datos."""
+    return _controller.get_months_with_data()
+
+@st.cache_data(ttl=300, show_spinner=False)
+def get_cached_compras_kpis(token, month, _controller):
+    """KPIs de compras de un período, memoizados por (datos, mes-año)."""
+    return _controller.get_compras_kpis(month)
+
+@st.cache_data(ttl=300, show_spinner=False)
+def get_cached_ventas_kpis(token, month, _controller):
+    """KPIs de ventas de un período, memoizados por (datos, mes-año)."""
+    return _controller.get_ventas_kpis(month)
+
+@st.cache_data(ttl=300, show_spinner=False)
+def get_cached_figure(token, chart_method, key, _controller):
+    """
+    Figura Plotly de un método create_* del controlador (memoizada).
+    
+    key es el mes-año (str) o la tupla de períodos; la figura se guarda como
+    dict, que st.plotly_chart acepta directamente.
+    """
+    months = list(key) if isinstance(key, tuple) else key
+    return getattr(_controller, chart_method)(months).to_dict()
 
 # ================================================================
 # FUNCIONES DE UTILIDAD
 # ================================================================
-def display_kpi_card(title, main_value, sub_values, card_type="default"):
-    """Muestra una KPI card con formato específico."""
-    card_class = f"kpi-card kpi-card-{card_type}"
-    
-    sub_values_html = ""
-    for label, value in sub_values:
-        sub_values_html += f'<div class="metric-value-small"><strong>{label}:</strong> {value}</div>'
-    
-    st.markdown(f"""
-    <div class="{card_class}">
-        <div class="metric-container">
-            <div class="metric-title">{title}</div>
-            <div class="metric-value-large">{main_value}</div>
-            {sub_values_html}
-        </div>
-    </div>
-    """, unsafe_allow_html=True)
+# Plantillas HTML de las KPI cards
+KPI_SUB_VALUE_TPL = '<div class="metric-value-small"><strong>{0}:</strong> {1}</div>'
+KPI_CARD_TPL = (
+    '<div class="kpi-card kpi-card-{card_type}"><div class="metric-container">'
+    '<div class="metric-title">{title}</div>'
+    '<div class="metric-value-large">{main_value}</div>{sub_values}</div></div>'
+)
+
+# Plantillas HTML del bloque de estado del panel de control
+STATUS_ACTIVE_TPL = (
+    '<div class="status-container"><div style="display: flex; align-items: center;">'
+    '<span class="status-indicator status-green"></span>'
+    '<strong>✅ Sistema Activo:</strong> Compras {compras_mark} | Ventas {ventas_mark}</div>'
+    '<div style="color: var(--text-secondary); font-size: 0.9rem;">'
+    '📊 {compras_records} compras | {ventas_records} ventas | '
+    '📅 {n_periods} períodos ({periods_text}) | 🔄 {last_update}</div></div>'
+)
+STATUS_INACTIVE_HTML = (
+    '<div class="status-container"><div style="display: flex; align-items: center;">'
+    '<span class="status-indicator status-red"></span>'
+    '<strong>❌ Sistema Inactivo:</strong> Datos no cargados</div></div>'
+)
+
+def kpi_card_html(title, main_value, sub_values, card_type="default"):
+    """Devuelve el HTML de una KPI card."""
+    return KPI_CARD_TPL.format(
+        card_type=card_type,
+        title=title,
+        main_value=main_value,
+        sub_values="".join(KPI_SUB_VALUE_TPL.format(label, value) for label, value in sub_values)
+    )
+
+def display_kpi_cards(cards):
+    """Muestra varias KPI cards (tuplas de argumentos) en una rejilla con un único st.html."""
+    st.html('<div class="kpi-grid">' + "".join(kpi_card_html(*card) for card in cards) + '</div>')
+
+def detect_dict_type(data):
+    """Clasifica un dict: resultado parseado o dict de DataFrames raw."""
+    if 'status' in data and 'message' in data and 'data' in data:
+        return 'parsed', f"Datos ya parseados (status: {data.get('status')})"
+    # Basta con el primer valor; el parser valida el resto de hojas
+    first = next(iter(data.values()), None)
+    if isinstance(first, pd.DataFrame):
+        return 'raw_excel', f'Dict con {len(data)} DataFrames raw'
+    return 'unknown_dict', f'Dict desconocido con claves: {list(data.keys())}'
+
+# Despacho por tipo exacto (comparación por identidad, sin recorrer la MRO)
+DATA_TYPE_DETECTORS = {
+    type(None): lambda data: ('none', 'Datos son None'),
+    str: lambda data: ('error_string', f'String error: {data[:100]}...'),
+    dict: detect_dict_type,
+    pd.DataFrame: lambda data: ('raw_dataframe', f'DataFrame raw con shape {data.shape}'),
+}
+
+def detect_data_type(data):
+    """Detecta si los datos están parseados o son raw."""
+    detector = DATA_TYPE_DETECTORS.get(type(data))
+    if detector is None:
+        # Subclases (p. ej. OrderedDict) caen aquí
+        detector = next(
+            (fn for cls, fn in DATA_TYPE_DETECTORS.items() if isinstance(data, cls)),
+            lambda data: ('unknown', f'Tipo desconocido: {type(data)}')
+        )
+    return detector(data)
+
+def render_debug_info(controller):
+    """Muestra el debug del controlador como JSON preformateado (más ligero que st.json)."""
+    st.code(
+        json.dumps(controller.get_debug_info(), indent=2, ensure_ascii=False, default=str),
+        language="json"
+    )
 
 # ================================================================
 # HEADER PRINCIPAL
 # ================================================================
-st.markdown("""
+HEADER_HTML = """
 <div class="main-header">
     <h1>🧄 Dashboard Compras y Ventas</h1>
     <h2>Garlic & Beyond KCTN - Análisis Comercial Integral</h2>
     <p>Sistema avanzado de análisis de compras y ventas con datos específicos por mes-año</p>
 </div>
-""", unsafe_allow_html=True)
+"""
 
 # ================================================================
 # INFORMACIÓN DE PERÍODO
 # ================================================================
-st.markdown("""
+PERIOD_ALERT_TPL = Template("""
 <div class="alert alert-info">
     <strong>📅 Período de Análisis:</strong> Datos de Compras y Ventas por mes/año | 
-    <strong>🔄 Última Actualización:</strong> """ + datetime.now().strftime('%d/%m/%Y %H:%M') + """
+    <strong>🔄 Última Actualización:</strong> $ts
     <br><strong>✅ SISTEMA CORREGIDO:</strong> Filtros unificados mes-año para precisión total
 </div>
-""", unsafe_allow_html=True)
+""")
+
+@st.cache_data(ttl=60, show_spinner=False)
+def get_update_timestamp():
+    """Marca de tiempo con resolución de minuto, compartida durante 60 s."""
+    return datetime.now().strftime('%d/%m/%Y %H:%M')
+
+# Cabecera y alerta de período se envían juntas en un único elemento
+page_top_parts = [HEADER_HTML, PERIOD_ALERT_TPL.substitute(ts=get_update_timestamp())]
+st.html("".join(page_top_parts))
 
 # ================================================================
 # PANEL DE CONTROL CON LÓGICA DE CARGA INTELIGENTE
 # ================================================================
-col1, col2, col3, col4 = st.columns([2, 1, 1, 1])
+@st.fragment
+def render_control_panel(controller):
+    """
+    Panel de control (estado + carga desde SharePoint).
+    
+    Es un fragment: sus botones solo re-ejecutan este bloque; tras una carga
+    correcta se fuerza st.rerun(scope="app") para refrescar el dashboard.
+    """
+    col1, col2, col3, col4 = st.columns([2, 1, 1, 1])
 
-with col1:
-    if controller:
-        status = controller.get_status()
-        if status['initialized']:
-            available_periods = status.get('available_months', [])
-            periods_preview = available_periods[:3] if len(available_periods) > 3 else available_periods
-            periods_text = ", ".join(periods_preview)
-            if len(available_periods) > 3:
-                periods_text += f" y {len(available_periods)-3} más"
-            
-            st.markdown(f"""
-            <div class="status-container">
-                <div style="display: flex; align-items: center;">
-                    <span class="status-indicator status-green"></span>
-                    <strong>✅ Sistema Activo:</strong> 
-                    {'Compras ✓' if status['has_compras'] else 'Compras ✗'} | 
-                    {'Ventas ✓' if status['has_ventas'] else 'Ventas ✗'}
-                </div>
-                <div style="color: var(--text-secondary); font-size: 0.9rem;">
-                    📊 {status['compras_records']} compras | {status['ventas_records']} ventas | 
-                    📅 {len(available_periods)} períodos ({periods_text}) | 🔄 {status['last_update']}
-                </div>
-            </div>
-            """, unsafe_allow_html=True)
+    with col1:
+        if controller:
+            status = get_cached_status(controller.cache_token(), controller)
+            if status['initialized']:
+                available_periods = status.get('available_months', [])
+                n_periods = len(available_periods)
+                periods_text = ", ".join(available_periods[:3]) + (f" y {n_periods - 3} más" if n_periods > 3 else "")
+                
+                st.html(STATUS_ACTIVE_TPL.format_map({
+                    'compras_mark': '✓' if status['has_compras'] else '✗',
+                    'ventas_mark': '✓' if status['has_ventas'] else '✗',
+                    'compras_records': status['compras_records'],
+                    'ventas_records': status['ventas_records'],
+                    'n_periods': n_periods,
+                    'periods_text': periods_text,
+                    'last_update': status['last_update'],
+                }))
+            else:
+                st.html(STATUS_INACTIVE_HTML)
         else:
-            st.markdown("""
-            <div class="status-container">
-                <div style="display: flex; align-items: center;">
-                    <span class="status-indicator status-red"></span>
-                    <strong>❌ Sistema Inactivo:</strong> Datos no cargados
-                </div>
-            </div>
-            """, unsafe_allow_html=True)
-    else:
-        st.error("❌ Controlador no disponible")
+            st.error("❌ Controlador no disponible")
 
-with col2:
-    if st.button("🔄 Cargar desde SharePoint", help="Cargar datos reales desde SharePoint"):
-        with st.spinner("Cargando datos desde SharePoint..."):
-            try:
-                if excel_available and get_dataframe:
-                    st.info("📥 Descargando datos desde SharePoint...")
-                    excel_data = get_dataframe('KCTN_05_Compras_Ventas')
+    with col2:
+        # La descarga corre en segundo plano; render_load_progress() sondea el resultado
+        loading = 'load_future' in st.session_state
+        if st.button("🔄 Cargar desde SharePoint", help="Cargar datos reales desde SharePoint", disabled=loading):
+            if excel_available and get_dataframe:
+                st.session_state.load_future = get_load_executor().submit(fetch_compras_ventas_data)
+                st.rerun(scope="app")
+            else:
+                st.error("❌ Módulos no disponibles")
+        
+        if 'load_result' in st.session_state:
+            load_result = st.session_state.pop('load_result')
+            with st.spinner("Procesando datos de SharePoint..."):
+                try:
+                    excel_data = load_result.result()
                     
-                    def detect_data_type(data):
-                        if data is None:
-                            return 'none', 'Datos son None'
-                        elif isinstance(data, str):
-                            return 'error_string', f'String error: {data[:100]}...'
-                        elif isinstance(data, dict):
-                            if 'status' in data and 'message' in data and 'data' in data:
-                                return 'parsed', f"Datos ya parseados (status: {data.get('status')})"
-                            elif all(isinstance(v, pd.DataFrame) for v in data.values()):
-                                return 'raw_excel', f'Dict con {len(data)} DataFrames raw'
-                            else:
-                                return 'unknown_dict', f'Dict desconocido con claves: {list(data.keys())}'
-                        elif isinstance(data, pd.DataFrame):
-                            return 'raw_dataframe', f'DataFrame raw con shape {data.shape}'
-                        else:
-                            return 'unknown', f'Tipo desconocido: {type(data)}'
+                    # No conservar en caché descargas fallidas
+                    if excel_data is None or isinstance(excel_data, str):
+                        fetch_compras_ventas_data.clear()
                     
                     data_type, description = detect_data_type(excel_data)
                     st.success(f"✅ Tipo detectado: {data_type}")
@@ -539,35 +379,36 @@ with col2:
                         st.success("🎉 Datos ya parseados por excel_loader - inicializando directamente")
                         
                         if excel_data.get('status') == 'success':
-                            with st.expander("🔍 Debug: Estructura de datos parseados"):
-                                st.write("**Status:**", excel_data.get('status'))
-                                st.write("**Message:**", excel_data.get('message'))
-                                
-                                data_content = excel_data.get('data', {})
-                                st.write("**Datos disponibles:**", list(data_content.keys()))
-                                
-                                for key, value in data_content.items():
-                                    st.write(f"**{key}:** {type(value)}")
-                                    if isinstance(value, pd.DataFrame):
-                                        st.write(f"  - Shape: {value.shape}")
-                                        st.write(f"  - Columnas: {list(value.columns)}")
+                            # Estructura solo con el toggle de debug activo, en un único bloque
+                            if st.session_state.get("show_debug_info", False):
+                                with st.expander("🔍 Debug: Estructura de datos parseados"):
+                                    data_content = excel_data.get('data', {})
+                                    st.code("\n".join([
+                                        f"status: {excel_data.get('status')}",
+                                        f"message: {excel_data.get('message')}",
+                                        *(
+                                            f"{key}: shape={value.shape} cols={len(value.columns)}"
+                                            if isinstance(value, pd.DataFrame) else f"{key}: {type(value).__name__}"
+                                            for key, value in data_content.items()
+                                        )
+                                    ]))
                             
-                            if controller and controller.initialize_with_data(excel_data):
+                            if controller and load_compras_ventas_controller(excel_data):
                                 st.success("✅ Datos cargados correctamente desde SharePoint")
-                                st.balloons()
+                                if SHOW_CELEBRATIONS:
+                                    st.balloons()
                                 
                                 metadata = excel_data.get('metadata', {})
                                 sheets_processed = metadata.get('sheets_processed', [])
                                 st.info(f"📊 Hojas procesadas: {', '.join(sheets_processed)}")
                                 
-                                st.rerun()
+                                st.rerun(scope="app")
                             else:
                                 st.error("❌ Error inicializando controlador con datos parseados")
                                 
                                 if controller:
                                     with st.expander("🔍 Debug Controller Detallado"):
-                                        debug_info = controller.get_debug_info()
-                                        st.json(debug_info)
+                                        render_debug_info(controller)
                         
                         elif excel_data.get('status') == 'error':
                             st.error(f"❌ Error en datos parseados: {excel_data.get('message')}")
@@ -586,9 +427,9 @@ with col2:
                                 parsed_data = parse_excel(excel_data)
                                 
                                 if parsed_data and parsed_data.get('status') in ['success', 'partial_success']:
-                                    if controller and controller.initialize_with_data(parsed_data):
+                                    if controller and load_compras_ventas_controller(parsed_data):
                                         st.success("✅ Datos raw parseados y cargados correctamente")
-                                        st.rerun()
+                                        st.rerun(scope="app")
                                     else:
                                         st.error("❌ Error inicializando controlador")
                                 else:
@@ -603,26 +444,27 @@ with col2:
                     else:
                         st.error(f"❌ Tipo de datos no soportado: {data_type}")
                         st.write(f"Descripción: {description}")
-                
-                else:
-                    st.error("❌ Módulos no disponibles")
                     
-            except Exception as e:
-                st.error(f"❌ Error crítico durante carga: {e}")
-                st.exception(e)
+                except Exception as e:
+                    st.error(f"❌ Error crítico durante carga: {e}")
+                    st.exception(e)
 
-with col3:
-    if st.button("📁 Subir Excel Local", help="Subir archivo Excel desde tu computadora"):
-        st.info("🔄 Funcionalidad próximamente disponible")
+    with col3:
+        if st.button("📁 Subir Excel Local", help="Subir archivo Excel desde tu computadora"):
+            st.info("🔄 Funcionalidad próximamente disponible")
 
-with col4:
-    if st.button("🐛 Debug Info", help="Mostrar información de debug"):
-        if controller:
-            debug_info = controller.get_debug_info()
-            with st.expander("🔍 Información de Debug"):
-                st.json(debug_info)
-        else:
-            st.error("Controller no disponible")
+    with col4:
+        # Toggle: el debug solo se calcula mientras está activado
+        if st.toggle("🐛 Debug Info", key="show_debug_info", help="Mostrar información de debug"):
+            if controller:
+                render_debug_info(controller)
+            else:
+                st.error("Controller no disponible")
+
+render_control_panel(controller)
+
+if 'load_future' in st.session_state:
+    render_load_progress()
 
 # ================================================================
 # CONTENIDO PRINCIPAL - SOLO SI HAY CONTROLADOR INICIALIZADO
@@ -635,6 +477,10 @@ if controller and controller.is_initialized:
     with st.sidebar:
         st.markdown("## 🎯 Panel de Control")
         
+        data_token = controller.cache_token()
+        available_months = get_cached_available_months(data_token, controller)
+        months_with_data = get_cached_months_with_data(data_token, controller)
+        
         # ✅ CORRECCIÓN: Selector de modo de análisis unificado
         analysis_mode = st.radio(
             "**Modo de Análisis:**",
@@ -644,9 +490,6 @@ if controller and controller.is_initialized:
         
         if analysis_mode == "📊 Análisis Individual":
             st.markdown("### 📅 Análisis Individual")
-            available_months = controller.get_available_months()
-            months_with_data = controller.get_months_with_data()
-            
             # ✅ CORRECCIÓN: Usar month_year format consistente
             selected_month = st.selectbox(
                 "**Seleccionar Período (Mes-Año):**", 
@@ -657,9 +500,6 @@ if controller and controller.is_initialized:
             
         else:
             st.markdown("### 📈 Comparación Multi-período")
-            available_months = controller.get_available_months()
-            months_with_data = controller.get_months_with_data()
-            
             # ✅ CORRECCIÓN: Usar same format para comparación
             selected_months = st.multiselect(
                 "**Períodos a Comparar (Mes-Año):**",
@@ -674,18 +514,17 @@ if controller and controller.is_initialized:
         if controller.is_initialized:
             st.markdown("### 📊 Información de Datos")
             
-            # Obtener años únicos de los datos
-            years_found = set()
-            if controller.compras_data is not None and 'año' in controller.compras_data.columns:
-                years_compras = controller.compras_data['año'].unique()
-                years_found.update(years_compras)
-            if controller.ventas_data is not None and 'año' in controller.ventas_data.columns:
-                years_ventas = controller.ventas_data['año'].unique()
-                years_found.update(years_ventas)
-            
-            if years_found:
-                years_sorted = sorted([int(y) for y in years_found if pd.notna(y) and y > 0])
-                st.info(f"📅 **Años con datos:** {', '.join(map(str, years_sorted))}")
+            # Obtener años únicos de los datos (unión ordenada en numpy)
+            year_arrays = [
+                df['año'].dropna().to_numpy()
+                for df in (controller.compras_data, controller.ventas_data)
+                if df is not None and 'año' in df.columns
+            ]
+            
+            if year_arrays:
+                years_sorted = np.unique(np.concatenate(year_arrays)).astype(np.int64)
+                years_sorted = years_sorted[years_sorted > 0]
+                st.info(f"📅 **Años con datos:** {', '.join(years_sorted.astype(str))}")
                 st.info(f"📊 **Total períodos:** {len(available_months)}")
     
     # ================================================================
@@ -703,7 +542,7 @@ if controller and controller.is_initialized:
             # COMPRAS - ANÁLISIS INDIVIDUAL
             # ================================================================
             
-            compras_kpis = controller.get_compras_kpis(selected_month)
+            compras_kpis = get_cached_compras_kpis(data_token, selected_month, controller)
             
             st.markdown(f"""
             <div class="section-header">
@@ -714,11 +553,23 @@ if controller and controller.is_initialized:
             if not compras_kpis['has_data']:
                 st.info(f"📅 {selected_month} - Datos de compras pendientes")
             
-            # 4 KPI Cards en 2 filas
-            col1, col2 = st.columns(2)
+            if compras_kpis['compras_por_departamento']:
+                top_depto = max(compras_kpis['compras_por_departamento'].items(), key=lambda x: x[1])
+                depto_card = (
+                    "📊 Departamento Principal",
+                    f"€{top_depto[1]:,.0f}",
+                    [
+                        ("Departamento", top_depto[0]),
+                        ("% del Total", f"{(top_depto[1]/compras_kpis['total_compras']*100) if compras_kpis['total_compras'] > 0 else 0:.1f}%"),
+                    ],
+                    "default"
+                )
+            else:
+                depto_card = ("📊 Departamento Principal", "€0", [("Sin datos", "")], "default")
             
-            with col1:
-                display_kpi_card(
+            # 4 KPI Cards en 2 filas
+            display_kpi_cards([
+                (
                     "💰 Total Valor de Compras",
                     f"€{compras_kpis['total_compras']:,.0f}",
                     [
@@ -726,10 +577,8 @@ if controller and controller.is_initialized:
                         ("Departamentos", f"{len(compras_kpis['compras_por_departamento'])}"),
                     ],
                     "compras"
-                )
-            
-            with col2:
-                display_kpi_card(
+                ),
+                (
                     "🏭 Proveedores Materia Prima",
                     f"€{compras_kpis['total_materia_prima']:,.0f}",
                     [
@@ -737,27 +586,9 @@ if controller and controller.is_initialized:
                         ("% del Total", f"{(compras_kpis['total_materia_prima']/compras_kpis['total_compras']*100) if compras_kpis['total_compras'] > 0 else 0:.1f}%"),
                     ],
                     "proveedores"
-                )
-            
-            col3, col4 = st.columns(2)
-            
-            with col3:
-                if compras_kpis['compras_por_departamento']:
-                    top_depto = max(compras_kpis['compras_por_departamento'].items(), key=lambda x: x[1])
-                    display_kpi_card(
-                        "📊 Departamento Principal",
-                        f"€{top_depto[1]:,.0f}",
-                        [
-                            ("Departamento", top_depto[0]),
-                            ("% del Total", f"{(top_depto[1]/compras_kpis['total_compras']*100) if compras_kpis['total_compras'] > 0 else 0:.1f}%"),
-                        ],
-                        "default"
-                    )
-                else:
-                    display_kpi_card("📊 Departamento Principal", "€0", [("Sin datos", "")], "default")
-            
-            with col4:
-                display_kpi_card(
+                ),
+                depto_card,
+                (
                     "🤝 Proveedores Activos",
                     f"{compras_kpis['proveedores_activos_count']}",
                     [
@@ -765,7 +596,8 @@ if controller and controller.is_initialized:
                         ("Promedio/Proveedor", f"€{(compras_kpis['total_compras']/compras_kpis['proveedores_activos_count']) if compras_kpis['proveedores_activos_count'] > 0 else 0:,.0f}"),
                     ],
                     "default"
-                )
+                ),
+            ])
             
             # Gráficos Compras Individuales
             st.markdown(f"""
@@ -778,12 +610,12 @@ if controller and controller.is_initialized:
             
             with col1:
                 st.subheader("📊 Compras por Departamento")
-                fig_barras_depto = controller.create_compras_barras_departamento(selected_month)
+                fig_barras_depto = get_cached_figure(data_token, 'create_compras_barras_departamento', selected_month, controller)
                 st.plotly_chart(fig_barras_depto, use_container_width=True)
             
             with col2:
                 st.subheader("🏭 Materia Prima por Proveedor")
-                fig_pie_materia = controller.create_compras_pie_materia_prima(selected_month)
+                fig_pie_materia = get_cached_figure(data_token, 'create_compras_pie_materia_prima', selected_month, controller)
                 st.plotly_chart(fig_pie_materia, use_container_width=True)
         
         else:
@@ -826,7 +658,7 @@ if controller and controller.is_initialized:
             # ================================================================
             
             # ✅ CORRECCIÓN: Usar selected_month (que ya incluye año)
-            ventas_kpis = controller.get_ventas_kpis(selected_month)
+            ventas_kpis = get_cached_ventas_kpis(data_token, selected_month, controller)
             
             st.markdown(f"""
             <div class="section-header">
@@ -837,11 +669,11 @@ if controller and controller.is_initialized:
             if not ventas_kpis['has_data']:
                 st.info(f"📅 {selected_month} - Datos de ventas pendientes")
             
-            # 4 KPI Cards en 2 filas
-            col1, col2 = st.columns(2)
+            productos_count = len(ventas_kpis['categorias_vendidas'])
             
-            with col1:
-                display_kpi_card(
+            # 4 KPI Cards en 2 filas
+            display_kpi_cards([
+                (
                     "💰 Total Ventas Mensuales",
                     f"€{ventas_kpis['total_ventas']:,.0f}",
                     [
@@ -849,10 +681,8 @@ if controller and controller.is_initialized:
                         ("€/Kg Promedio", f"€{(ventas_kpis['total_ventas']/ventas_kpis['total_kgs']) if ventas_kpis['total_kgs'] > 0 else 0:.2f}"),
                     ],
                     "ventas"
-                )
-            
-            with col2:
-                display_kpi_card(
+                ),
+                (
                     "⚖️ Total Kg Mensuales",
                     f"{ventas_kpis['total_kgs']:,.0f} kg",
                     [
@@ -860,13 +690,8 @@ if controller and controller.is_initialized:
                         ("Kg/Cliente", f"{(ventas_kpis['total_kgs']/ventas_kpis['clientes_activos_count']) if ventas_kpis['clientes_activos_count'] > 0 else 0:,.0f} kg"),
                     ],
                     "default"
-                )
-            
-            col3, col4 = st.columns(2)
-            
-            with col3:
-                productos_count = len(ventas_kpis['categorias_vendidas'])
-                display_kpi_card(
+                ),
+                (
                     "📦 Productos Vendidos",
                     f"{productos_count}",
                     [
@@ -874,10 +699,8 @@ if controller and controller.is_initialized:
                         ("Diversificación", "Alta" if productos_count > 3 else "Media" if productos_count > 1 else "Baja"),
                     ],
                     "default"
-                )
-            
-            with col4:
-                display_kpi_card(
+                ),
+                (
                     "🤝 Clientes Activos",
                     f"{ventas_kpis['clientes_activos_count']}",
                     [
@@ -885,7 +708,8 @@ if controller and controller.is_initialized:
                         ("€/Cliente", f"€{(ventas_kpis['total_ventas']/ventas_kpis['clientes_activos_count']) if ventas_kpis['clientes_activos_count'] > 0 else 0:,.0f}"),
                     ],
                     "clientes"
-                )
+                ),
+            ])
             
             # Lista de clientes (si hay datos)
             if ventas_kpis['clientes_lista']:
@@ -906,19 +730,19 @@ if controller and controller.is_initialized:
             
             # ✅ CORRECCIÓN: Usar selected_month en todos los gráficos
             st.subheader("📈 Tendencia de Facturación")
-            fig_tendencia = controller.create_ventas_tendencia_facturado(selected_month)
+            fig_tendencia = get_cached_figure(data_token, 'create_ventas_tendencia_facturado', selected_month, controller)
             st.plotly_chart(fig_tendencia, use_container_width=True)
             
             col1, col2 = st.columns(2)
             
             with col1:
                 st.subheader("🤝 Ventas por Cliente")
-                fig_barras_cliente = controller.create_ventas_barras_cliente(selected_month)
+                fig_barras_cliente = get_cached_figure(data_token, 'create_ventas_barras_cliente', selected_month, controller)
                 st.plotly_chart(fig_barras_cliente, use_container_width=True)
             
             with col2:
                 st.subheader("📦 Distribución por Producto")
-                fig_pie_productos = controller.create_ventas_pie_productos(selected_month)
+                fig_pie_productos = get_cached_figure(data_token, 'create_ventas_pie_productos', selected_month, controller)
                 st.plotly_chart(fig_pie_productos, use_container_width=True)
         
         else:
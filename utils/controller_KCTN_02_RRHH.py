@@ -14,6 +14,7 @@ import pandas as pd
 import numpy as np
 import plotly.express as px
 import plotly.graph_objects as go
+import plotly.io as pio
 from plotly.subplots import make_subplots
 from datetime import datetime
 from typing import Dict, Any, List, Optional, Union
@@ -21,6 +22,14 @@ import warnings
 
 warnings.filterwarnings('ignore')
 
+# Plantilla Plotly compartida (fondos transparentes) registrada una sola vez;
+# se combina con la plantilla base para no alterar el resto de páginas
+pio.templates['gandb_rrhh'] = go.layout.Template(layout=dict(
+    plot_bgcolor='rgba(0,0,0,0)',
+    paper_bgcolor='rgba(0,0,0,0)'
+))
+RRHH_TEMPLATE = 'plotly+gandb_rrhh'
+
 class GarlicRRHHController:
     """Controlador completo para RRHH de Garlic & Beyond."""
     
@@ -34,6 +43,7 @@ class GarlicRRHHController:
         self.is_initialized = False
         self.last_update = None
         self.processed_months = []
+        self.kpi_frame = pd.DataFrame()
         
         # Configuración de colores específica para Garlic & Beyond
         self.colors = {
@@ -90,6 +100,9 @@ class GarlicRRHHController:
             metadata = parsed_data.get('metadata', {})
             self.processed_months = metadata.get('processed_months', [])
             
+            # KPIs de todos los meses precalculados en una única tabla
+            self.kpi_frame = self._build_kpi_frame()
+            
             self.is_initialized = True
             self.last_update = datetime.now()
             
@@ -112,6 +125,23 @@ class GarlicRRHHController:
                 months_with_data.append(self.meses_nombres[mes])
         return months_with_data
     
+    def _build_kpi_frame(self) -> pd.DataFrame:
+        """
+        Precalcula los KPIs numéricos de todos los meses en un DataFrame
+        indexado por nombre de mes (una fila por mes).
+        """
+        records = []
+        for month in self.get_available_months():
+            kpis = self.get_monthly_kpis(month)
+            kpis.pop('empleados_baja_detalle', None)
+            records.append(kpis)
+        return pd.DataFrame.from_records(records).set_index('month_name')
+    
+    def _kpi_rows_with_data(self, months: List[str]) -> pd.DataFrame:
+        """Filas de kpi_frame para los meses indicados que tienen datos."""
+        frame = self.kpi_frame.loc[months]
+        return frame[frame['has_data']]
+    
     def _normalize_month_name(self, month_display_name: str) -> Optional[str]:
         """Convierte nombre de mes para display a clave interna."""
         for key, display in self.meses_nombres.items():
@@ -240,8 +270,7 @@ class GarlicRRHHController:
             xaxis_title="Sección",
             yaxis_title="Coste (€)",
             showlegend=False,
-            plot_bgcolor='rgba(0,0,0,0)',
-            paper_bgcolor='rgba(0,0,0,0)',
+            template=RRHH_TEMPLATE,
             height=400
         )
         
@@ -311,7 +340,7 @@ class GarlicRRHHController:
         if not month_key or month_key not in self.monthly_data:
             return {
                 'cantidad_bajas': 0,
-                'empleados_baja': [],
+                'empleados_baja': {'nombre': [], 'seccion': [], 'coste': [], 'porcentaje_coste': []},
                 'coste_total_bajas': 0,
                 'porcentaje_coste_bajas': 0
             }
@@ -325,15 +354,20 @@ class GarlicRRHHController:
         if totales['coste_total_mes'] > 0:
             porcentaje_coste = (stats['coste_bajas'] / totales['coste_total_mes']) * 100
         
-        # Preparar lista detallada de empleados de baja
-        empleados_baja_detalle = []
-        for emp in stats['empleados_baja_detalle']:
-            empleados_baja_detalle.append({
-                'nombre': emp['nombre'],
-                'seccion': emp['seccion'],
-                'coste': emp['coste_total'],
-                'porcentaje_coste': (emp['coste_total'] / totales['coste_total_mes'] * 100) if totales['coste_total_mes'] > 0 else 0
-            })
+        # Detalle de empleados de baja en formato columnar (dict de columnas)
+        detalle = stats['empleados_baja_detalle']
+        costes = np.array([emp['coste_total'] for emp in detalle], dtype=float)
+        if totales['coste_total_mes'] > 0:
+            porcentajes = costes / totales['coste_total_mes'] * 100
+        else:
+            porcentajes = np.zeros(len(costes))
+        
+        empleados_baja_detalle = {
+            'nombre': [emp['nombre'] for emp in detalle],
+            'seccion': [emp['seccion'] for emp in detalle],
+            'coste': costes,
+            'porcentaje_coste': porcentajes
+        }
         
         return {
             'cantidad_bajas': stats['empleados_baja'],
@@ -371,23 +405,22 @@ class GarlicRRHHController:
             ('💰 Coste Total Personal (Hora)', 'total_coste_hora', '€'),
         ]
         
-        # Construir datos de la tabla
+        # Construir datos de la tabla a partir del corte de kpi_frame
+        frame = self.kpi_frame.loc[valid_months]
         table_data = []
         
         for metrica_nombre, metrica_key, unidad in metricas:
-            row = {'Métrica': metrica_nombre}
+            values = frame[metrica_key].tolist()
             
-            for month in valid_months:
-                kpis = self.get_monthly_kpis(month)
-                value = kpis.get(metrica_key, 0)
-                
-                if unidad == '€':
-                    row[month] = f"€{value:,.0f}" if value > 0 else "€0"
-                elif unidad == '%':
-                    row[month] = f"{value:.1f}%" if value > 0 else "0%"
-                else:
-                    row[month] = f"{value:,.1f}" if value > 0 else "0"
+            if unidad == '€':
+                formatted = [f"€{value:,.0f}" if value > 0 else "€0" for value in values]
+            elif unidad == '%':
+                formatted = [f"{value:.1f}%" if value > 0 else "0%" for value in values]
+            else:
+                formatted = [f"{value:,.1f}" if value > 0 else "0" for value in values]
             
+            row = {'Métrica': metrica_nombre}
+            row.update(zip(valid_months, formatted))
             table_data.append(row)
         
         return pd.DataFrame(table_data)
@@ -403,19 +436,12 @@ class GarlicRRHHController:
             fig.add_annotation(text="No hay meses seleccionados", showarrow=False)
             return fig
         
-        # Obtener datos para cada mes
-        months = []
-        coste_mes = []
-        coste_dia = []
-        coste_hora = []
-        
-        for month in valid_months:
-            kpis = self.get_monthly_kpis(month)
-            if kpis.get('has_data', False):
-                months.append(month)
-                coste_mes.append(kpis['total_coste_mes'])
-                coste_dia.append(kpis['total_coste_dia'])
-                coste_hora.append(kpis['total_coste_hora'])
+        # Obtener datos de los meses con datos
+        frame = self._kpi_rows_with_data(valid_months)
+        months = frame.index.tolist()
+        coste_mes = frame['total_coste_mes'].tolist()
+        coste_dia = frame['total_coste_dia'].tolist()
+        coste_hora = frame['total_coste_hora'].tolist()
         
         if not months:
             fig = go.Figure()
@@ -475,8 +501,7 @@ class GarlicRRHHController:
             title="📈 Evolución de Costes Totales",
             showlegend=False,
             height=600,
-            plot_bgcolor='rgba(0,0,0,0)',
-            paper_bgcolor='rgba(0,0,0,0)'
+            template=RRHH_TEMPLATE
         )
         
         return fig
@@ -486,13 +511,9 @@ class GarlicRRHHController:
         Crea gráfico de barras agrupadas para comparar costes por sección entre meses.
         """
         valid_months = [mes for mes in selected_months if mes in self.get_available_months()]
-        months_with_data = []
         
         # Filtrar solo meses con datos
-        for month in valid_months:
-            kpis = self.get_monthly_kpis(month)
-            if kpis.get('has_data', False):
-                months_with_data.append(month)
+        months_with_data = self._kpi_rows_with_data(valid_months).index.tolist()
         
         if not months_with_data:
             fig = go.Figure()
@@ -545,8 +566,7 @@ class GarlicRRHHController:
             yaxis_title="Coste (€)",
             barmode='group',
             height=500,
-            plot_bgcolor='rgba(0,0,0,0)',
-            paper_bgcolor='rgba(0,0,0,0)'
+            template=RRHH_TEMPLATE
         )
         
         return fig
@@ -557,16 +577,10 @@ class GarlicRRHHController:
         """
         valid_months = [mes for mes in selected_months if mes in self.get_available_months()]
         
-        months = []
-        costes_bajas = []
-        numero_bajas = []
-        
-        for month in valid_months:
-            kpis = self.get_monthly_kpis(month)
-            if kpis.get('has_data', False):
-                months.append(month)
-                costes_bajas.append(kpis['bajas_coste_total'])
-                numero_bajas.append(kpis['bajas_numero'])
+        frame = self._kpi_rows_with_data(valid_months)
+        months = frame.index.tolist()
+        costes_bajas = frame['bajas_coste_total'].tolist()
+        numero_bajas = frame['bajas_numero'].tolist()
         
         if not months:
             fig = go.Figure()
@@ -612,8 +626,7 @@ class GarlicRRHHController:
         fig.update_layout(
             title="🏥 Tendencia de Bajas a través del Tiempo",
             height=400,
-            plot_bgcolor='rgba(0,0,0,0)',
-            paper_bgcolor='rgba(0,0,0,0)'
+            template=RRHH_TEMPLATE
         )
         
         return fig
@@ -27,6 +27,15 @@ MESES_ESPANOL = {
 
 MESES_ESPANOL_REVERSE = {v: k for k, v in MESES_ESPANOL.items()}
 
+# Umbrales de la matriz de rendimiento: columna -> (campo, es_minimo, umbral)
+PERFORMANCE_THRESHOLDS = {
+    '% DESG': ('porcentaje_desg', True, 0.85),
+    '% CAT I': ('porcentaje_cat1', True, 0.55),
+    '% CAT II': ('porcentaje_cat2', True, 0.25),
+    '% DAG': ('porcentaje_dag', True, 0.20),
+    '% MERMA': ('porcentaje_merma', False, 0.10),
+}
+
 class CostosKCTNController:
     """Controller principal para el módulo de Costos KCTN."""
     
@@ -403,52 +412,20 @@ class CostosKCTNController:
             if month_df.empty:
                 return pd.DataFrame()
             
-            # Crear DataFrame para la matriz
-            matrix_data = []
-            
-            for idx, row in month_df.iterrows():
-                fecha_str = row['fecha_entrega'].strftime('%d/%m/%Y') if pd.notna(row['fecha_entrega']) else 'N/A'
-                
-                # Formatear valores con colores usando emojis
-                def format_with_color(value, column):
-                    if pd.isna(value):
-                        return "N/A"
-                    
-                    pct_value = value * 100
-                    formatted = f"{pct_value:.1f}%"
-                    
-                    # Determinar color según umbrales
-                    if column == 'desg':
-                        return f"🟢 {formatted}" if value >= 0.85 else f"🔴 {formatted}"
-                    elif column == 'cat1':
-                        return f"🟢 {formatted}" if value >= 0.55 else f"🔴 {formatted}"
-                    elif column == 'cat2':
-                        return f"🟢 {formatted}" if value >= 0.25 else f"🔴 {formatted}"
-                    elif column == 'dag':
-                        return f"🟢 {formatted}" if value >= 0.20 else f"🔴 {formatted}"
-                    elif column == 'merma':
-                        return f"🟢 {formatted}" if value <= 0.10 else f"🔴 {formatted}"
-                    else:
-                        return formatted
-                
-                # Crear fila con valores formateados y coloreados
-                matrix_row = {
-                    'Proveedor': row['proveedor'],
-                    'Fecha': fecha_str,
-                    '% DESG': format_with_color(row['porcentaje_desg'], 'desg'),
-                    '% CAT I': format_with_color(row['porcentaje_cat1'], 'cat1'),
-                    '% CAT II': format_with_color(row['porcentaje_cat2'], 'cat2'),
-                    '% DAG': format_with_color(row['porcentaje_dag'], 'dag'),
-                    '% MERMA': format_with_color(row['porcentaje_merma'], 'merma')
-                }
-                
-                matrix_data.append(matrix_row)
-            
-            if not matrix_data:
-                return pd.DataFrame()
-            
-            # Crear DataFrame
-            df_matrix = pd.DataFrame(matrix_data)
+            # Construir la matriz por columnas: el umbral se evalúa sobre la
+            # columna completa y se antepone el indicador de color
+            df_matrix = pd.DataFrame({
+                'Proveedor': month_df['proveedor'].values,
+                'Fecha': month_df['fecha_entrega'].dt.strftime('%d/%m/%Y').values
+            })
+            
+            for column, (field, is_minimum, threshold) in PERFORMANCE_THRESHOLDS.items():
+                values = month_df[field]
+                ok = values >= threshold if is_minimum else values <= threshold
+                formatted = (values * 100).map('{:.1f}%'.format)
+                df_matrix[column] = np.where(
+                    values.isna(), 'N/A', np.where(ok, '🟢 ', '🔴 ') + formatted
+                )
             
             return df_matrix
             
@@ -472,24 +449,25 @@ class CostosKCTNController:
                     
                     # Solo incluir el mes si tiene datos válidos
                     if kpis['total_records'] > 0 and (kpis['total_kg_mp'] > 0 or kpis['total_inversion'] > 0):
-                        # Preparar fila de datos
+                        # Preparar fila de datos (valores numéricos; los porcentajes en escala 0-100).
+                        # El formato se aplica al mostrar la tabla.
                         row = {
                             'Mes': month,
                             'Total Registros': kpis['total_records'],
                             'Total Proveedores': kpis['total_proveedores'],
-                            'Total kg M.P.': f"{kpis['total_kg_mp']:,.0f}",
-                            'Total Inversión': f"€{kpis['total_inversion']:,.0f}",
-                            'kg Desgranado': f"{kpis['total_kg_desgranado']:,.0f}",
-                            '% Desgrane': f"{kpis['promedio_porcentaje_desg']*100:.1f}%",
-                            'kg Cat 1': f"{kpis['total_kg_cat1']:,.0f}",
-                            '% Cat 1 Real': f"{kpis['promedio_porcentaje_cat1']*100:.1f}%",
-                            '% Cat 1 Esperado': f"{kpis['promedio_porcentaje_estimado']*100:.1f}%",
-                            'Diferencia %': f"{kpis['promedio_diferencia']*100:.1f}%",
-                            'Coste/kg Corredor': f"€{kpis['promedio_coste_kg_corredor']:.3f}",
-                            'Total Corredor': f"€{kpis['total_coste_corredor']:,.0f}",
-                            'Coste/kg Porte': f"€{kpis['promedio_coste_kg_porte']:.3f}",
-                            'Total Porte': f"€{kpis['total_porte']:,.0f}",
-                            'Coste/kg Cat 1': f"€{kpis['promedio_coste_kg_diente_cat1']:.3f}"
+                            'Total kg M.P.': kpis['total_kg_mp'],
+                            'Total Inversión': kpis['total_inversion'],
+                            'kg Desgranado': kpis['total_kg_desgranado'],
+                            '% Desgrane': kpis['promedio_porcentaje_desg'] * 100,
+                            'kg Cat 1': kpis['total_kg_cat1'],
+                            '% Cat 1 Real': kpis['promedio_porcentaje_cat1'] * 100,
+                            '% Cat 1 Esperado': kpis['promedio_porcentaje_estimado'] * 100,
+                            'Diferencia %': kpis['promedio_diferencia'] * 100,
+                            'Coste/kg Corredor': kpis['promedio_coste_kg_corredor'],
+                            'Total Corredor': kpis['total_coste_corredor'],
+                            'Coste/kg Porte': kpis['promedio_coste_kg_porte'],
+                            'Total Porte': kpis['total_porte'],
+                            'Coste/kg Cat 1': kpis['promedio_coste_kg_diente_cat1']
                         }
                         
                         table_data.append(row)
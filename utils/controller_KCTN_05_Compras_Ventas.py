@@ -22,6 +22,7 @@ import plotly.express as px
 import plotly.graph_objects as go
 from plotly.subplots import make_subplots
 from datetime import datetime
+import uuid
 import warnings
 warnings.filterwarnings('ignore')
 
@@ -35,6 +36,10 @@ class GarlicComprasVentasController:
         self.is_initialized = False
         self.metadata = {}
         
+        # Versión de los datos cargados (cambia en cada inicialización)
+        self.data_version = uuid.uuid4().hex
+        self.last_update = None
+        
         # Mapeo de números de mes a nombres
         self.month_names = {
             1: 'Enero', 2: 'Febrero', 3: 'Marzo', 4: 'Abril',
@@ -90,6 +95,8 @@ class GarlicComprasVentasController:
             # Reset datos previos
             self.compras_data = None
             self.ventas_data = None
+            self.data_version = uuid.uuid4().hex
+            self.last_update = datetime.now()
             
             # Cargar datos de compras
             if 'compras' in data and isinstance(data['compras'], pd.DataFrame):
@@ -132,11 +139,15 @@ class GarlicComprasVentasController:
             'compras_records': len(self.compras_data) if compras_valid else 0,
             'ventas_records': len(self.ventas_data) if ventas_valid else 0,
             'available_months': self.get_available_months(),
-            'last_update': datetime.now().strftime('%d/%m/%Y %H:%M')
+            'last_update': (self.last_update or datetime.now()).strftime('%d/%m/%Y %H:%M')
         }
         
         return status
     
+    def cache_token(self):
+        """Token que identifica los datos cargados, para memoizar consultas derivadas."""
+        return self.data_version
+    
     def get_available_months(self):
         """Obtiene lista de meses con año disponibles en los datos."""
         month_year_combinations = set()
@@ -535,6 +546,9 @@ class GarlicComprasVentasController:
             
             # Agrupar por fecha si existe, sino por día del mes
             if 'fecha_cobro' in valid_data.columns:
+                # Un punto por día natural: las marcas horarias no multiplican los puntos
+                if pd.api.types.is_datetime64_any_dtype(valid_data['fecha_cobro']):
+                    valid_data['fecha_cobro'] = valid_data['fecha_cobro'].dt.normalize()
                 daily_data = valid_data.groupby('fecha_cobro')['total_factura'].sum().reset_index()
                 x_col = 'fecha_cobro'
                 x_label = 'Fecha de Cobro'